@@ -8,19 +8,31 @@ A simple Flask API for hosting and distributing modpacks.
 
 import os
 import json
+import atexit
 import uuid
 import shutil
-import zipfile
 import tempfile
-import hashlib
-from datetime import datetime
+import logging
+import threading
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
 from flask import Flask, request, jsonify, send_file, abort, render_template
 from flask_cors import CORS
 from flask_httpauth import HTTPBasicAuth
 import requests
-from mod_sources import ModrinthClient
+from mod_sources import ModSource, ModrinthClient, UpstreamUnavailable, load_sources, federated_search
+from search_index import ModIndex
+from dependency_resolver import DependencyResolver, check_manifest, describe_problems
+import modpack_store
+import static_export
+import zip_stream
+import request_logging
+import integrity
+import upload_validation
+from download_scheduler import DownloadScheduler
 import flask
+import click
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 app = Flask(__name__,
           template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'),
@@ -32,17 +44,46 @@ app.jinja_env.cache = {}  # Disable cache
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.config['DEBUG'] = True
 
+# Number of reverse proxies in front of the app whose X-Forwarded-For and
+# X-Forwarded-Proto headers are trusted, so per-client limits see real client IPs
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
 CORS(app)
 auth = HTTPBasicAuth()
+logger = logging.getLogger(__name__)
 
 # Configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modpacks')
 ALLOWED_EXTENSIONS = {'zip'}
 MAX_CONTENT_LENGTH = 1024 * 1024 * 1024  # 1GB max upload size
+UPLOAD_LIMITS = upload_validation.UploadLimits(
+    max_entries=int(os.environ.get('UPLOAD_MAX_ENTRIES', 10000)),
+    max_total_size=int(os.environ.get('UPLOAD_MAX_UNCOMPRESSED_SIZE', 4 * 1024 * 1024 * 1024)),
+    max_ratio=int(os.environ.get('UPLOAD_MAX_COMPRESSION_RATIO', 100))
+)
+KEEP_VERSIONS = int(os.environ.get('MODPACK_KEEP_VERSIONS', 0))  # 0 keeps every version
+STATIC_EXPORT_FOLDER = os.environ.get('STATIC_EXPORT_FOLDER')  # Unset disables the static mirror
+STATIC_EXPORT_BASE_URL = os.environ.get('STATIC_EXPORT_BASE_URL', '')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
+# Download counts are kept apart from modpacks.json and flushed in batches
+download_counter = modpack_store.DownloadCounter(
+    UPLOAD_FOLDER, flush_interval=int(os.environ.get('DOWNLOAD_COUNT_FLUSH_INTERVAL', 5)))
+atexit.register(download_counter.flush)
+
+# High-volume routes only log a sample of their successful requests
+LOG_SAMPLE_RATES = {
+    'get_modpack_icon': 0.05,
+    'static_files': 0.05,
+    'search_mods': 0.25,
+    'get_popular_mods': 0.25
+}
+request_logging.setup_logging(app, level=os.environ.get('LOG_LEVEL', 'INFO'), sample_rates=LOG_SAMPLE_RATES)
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -77,68 +118,250 @@ def load_modpacks():
         with open(modpacks_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        print(f"Error loading modpacks: {e}")
+        logger.error("Error loading modpacks: %s", e)
         return []
 
+# Modpacks by id, rebuilt only when modpacks.json changes on disk. Download
+# counts live in download_counter, so counting a download does not rebuild it.
+_catalog_index = {'key': None, 'modpacks': {}}
+_catalog_lock = threading.Lock()
+
+def get_catalog_index():
+    """
+    Get a read-only index of modpacks by id.
+
+    Each entry holds the modpack metadata and a map of every retained
+    version's file hash to its version id. The version, hash and size are
+    taken from the current version record, the one downloads are served from.
+    """
+    modpacks_file = os.path.join(UPLOAD_FOLDER, 'modpacks.json')
+    try:
+        stat = os.stat(modpacks_file)
+        # modpacks.json is replaced atomically, so a new inode means new content
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = None
+
+    with _catalog_lock:
+        if key is not None and key == _catalog_index['key']:
+            return _catalog_index['modpacks']
+
+    # Built outside the lock so requests served from the old index never wait on disk reads
+    index = {}
+    for modpack in load_modpacks():
+        versions = modpack_store.list_versions(UPLOAD_FOLDER, modpack['id'])
+        current = next((v for v in versions if v['current']), None)
+        if current:
+            modpack.update({field: current[field] for field in ('version', 'version_id', 'file_size', 'file_hash')})
+        index[modpack['id']] = {
+            'modpack': modpack,
+            'version_hashes': {v['file_hash']: v['version_id'] for v in versions if v.get('file_hash')}
+        }
+
+    with _catalog_lock:
+        _catalog_index['key'] = key
+        _catalog_index['modpacks'] = index
+    return index
+
+def list_catalog():
+    """Get all modpacks from the catalog index with up-to-date download counts."""
+    counts = download_counter.counts()
+    modpacks = []
+    for entry in get_catalog_index().values():
+        modpack = dict(entry['modpack'])
+        modpack['download_count'] = modpack.get('download_count', 0) + counts.get(modpack['id'], 0)
+        modpacks.append(modpack)
+    return modpacks
+
 def save_modpacks(modpacks):
     """Save modpack metadata to modpacks.json file."""
     modpacks_file = os.path.join(UPLOAD_FOLDER, 'modpacks.json')
     try:
-        with open(modpacks_file, 'w', encoding='utf-8') as f:
-            json.dump(modpacks, f, indent=4)
+        modpack_store.atomic_write_json(modpacks_file, modpacks, indent=4)
     except Exception as e:
-        print(f"Error saving modpacks: {e}")
+        logger.error("Error saving modpacks: %s", e)
 
 def extract_modpack_info(modpack_path):
     """Extract modpack info from the uploaded file."""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Extract zip file
-        with zipfile.ZipFile(modpack_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-            
+    zip_ref, members = upload_validation.open_validated(modpack_path, UPLOAD_LIMITS)
+    with zip_ref:
         # Look for manifest.json
-        manifest_path = os.path.join(temp_dir, 'manifest.json')
-        if not os.path.exists(manifest_path):
+        if 'manifest.json' not in members:
             raise ValueError("No manifest.json found in modpack")
             
         # Load manifest
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            manifest = json.load(f)
+        try:
+            manifest = json.loads(upload_validation.read_entry(
+                zip_ref, members['manifest.json'], UPLOAD_LIMITS.max_manifest_size).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Invalid manifest.json: {e}")
             
         # Extract required fields
         required_fields = ['id', 'name', 'version', 'mc_versions', 'author', 'description']
         for field in required_fields:
             if field not in manifest:
                 raise ValueError(f"Missing required field: {field}")
+
+        # The id is used as a directory name
+        modpack_id = str(manifest['id'])
+        if not modpack_id.replace('_', '').replace('-', '').isalnum():
+            raise ValueError('Modpack ID should only contain letters, numbers, underscores or hyphens')
                 
-        # Find icon if present
-        icon_file = None
+        # Read icon if present
+        icon_data = None
+        icon_ext = None
         icon_path = manifest.get('icon_path')
-        if icon_path and os.path.exists(os.path.join(temp_dir, icon_path)):
-            icon_file = os.path.join(temp_dir, icon_path)
+        if icon_path and icon_path in members and \
+                os.path.splitext(icon_path)[1].lower() in ['.png', '.jpg', '.jpeg', '.gif']:
+            icon_data = upload_validation.read_entry(zip_ref, members[icon_path], UPLOAD_LIMITS.max_icon_size)
+            icon_ext = os.path.splitext(icon_path)[1].lower()
             
         # Count mods
         mod_count = len(manifest.get('mods', []))
             
         return {
-            'id': manifest['id'],
+            'id': modpack_id,
             'name': manifest['name'],
             'version': manifest['version'],
             'mc_versions': manifest['mc_versions'],
             'author': manifest['author'],
             'description': manifest['description'],
             'mod_count': mod_count,
-            'icon_file': icon_file
+            'warnings': check_manifest(manifest),
+            'icon_data': icon_data,
+            'icon_ext': icon_ext
         }
 
 def calculate_file_hash(file_path):
     """Calculate SHA-256 hash of file."""
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        # Read and update hash in chunks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+    return integrity.hash_file(file_path)
+
+def apply_version_record(modpack, record):
+    """Copy the metadata of a stored version onto a modpack entry."""
+    modpack_id = modpack['id']
+    modpack['version'] = record['version']
+    modpack['version_id'] = record['version_id']
+    modpack['mc_versions'] = record.get('mc_versions', modpack.get('mc_versions', []))
+    modpack['mod_count'] = record.get('mod_count', 0)
+    modpack['file_size'] = record['file_size']
+    modpack['file_hash'] = record['file_hash']
+    modpack['download_url'] = f"/api/modpacks/{modpack_id}/download"
+    modpack['updated_at'] = datetime.now().isoformat()
+    if record.get('icon_file'):
+        modpack['icon_url'] = f"/api/modpacks/{modpack_id}/icon"
+
+def publish_version(modpack_id, staging_dir, info):
+    """
+    Store a staged build as a new version and make it the current one.
+
+    Must be called under ``modpack_store.catalog_lock`` and followed by saving
+    the catalog before the lock is released.
+    """
+    record = modpack_store.commit_version(UPLOAD_FOLDER, modpack_id, staging_dir, info)
+    modpack_store.set_current_version(UPLOAD_FOLDER, modpack_id, record['version_id'])
+    # Files of the layout used before versioning are superseded now
+    modpack_store.remove_legacy_files(UPLOAD_FOLDER, modpack_id)
+    if KEEP_VERSIONS:
+        modpack_store.prune_versions(UPLOAD_FOLDER, modpack_id, KEEP_VERSIONS)
+    return record
+
+def refresh_static_export():
+    """Bring the static mirror in line with the current catalog, if enabled."""
+    if not STATIC_EXPORT_FOLDER:
+        return None
+    try:
+        return static_export.export_snapshot(UPLOAD_FOLDER, STATIC_EXPORT_FOLDER, STATIC_EXPORT_BASE_URL,
+                                            hash_cache, load_modpacks)
+    except Exception:
+        logger.exception("Error exporting static snapshot")
+        return None
+
+def send_modpack_file(modpack_id, modpack_file, download_name, file_hash=None):
+    """
+    Serve a modpack zip through the download scheduler.
+
+    ``file_hash`` is the recorded SHA-256 of the file and becomes its strong
+    ETag; without it a weak ETag is derived from the file's mtime and size.
+    Conditional and range requests are honoured, and a range is only served
+    when ``If-Range`` still matches, so a resumed download never mixes bytes
+    of two different versions.
+    """
+    stat = os.stat(modpack_file)
+    file_size = stat.st_size
+    etag, weak = (file_hash, False) if file_hash else (f"{stat.st_mtime_ns:x}-{file_size:x}", True)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+
+    def with_validators(response):
+        response.set_etag(etag, weak=weak)
+        response.last_modified = last_modified
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = bool(request.if_modified_since and last_modified <= request.if_modified_since)
+    if not_modified:
+        return with_validators(flask.Response(status=304))
+
+    start, length, status = 0, file_size, 200
+    byte_range = request.range
+    if_range = request.if_range
+    if if_range.etag:
+        # Ranges of a weak or changed ETag could splice two different files
+        range_valid = not weak and if_range.etag == etag
+    elif if_range.date:
+        range_valid = last_modified <= if_range.date
+    else:
+        range_valid = True
+    if byte_range and range_valid and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        bounds = byte_range.range_for_length(file_size)
+        if bounds is None:
+            response = with_validators(flask.Response(status=416))
+            response.headers['Content-Range'] = f"bytes */{file_size}"
+            return response
+        start, stop = bounds
+        length, status = stop - start, 206
+
+    headers = {'Content-Disposition': f'attachment; filename="{download_name}"'}
+    if status == 206:
+        headers['Content-Range'] = f"bytes {start}-{start + length - 1}/{file_size}"
+
+    # HEAD requests neither take a download slot nor count as a download
+    if request.method == 'HEAD':
+        response = with_validators(flask.Response(status=status, mimetype='application/zip', headers=headers))
+        response.headers['Content-Length'] = str(length)
+        return response
+
+    slot = download_scheduler.acquire(request.remote_addr)
+    if slot is None:
+        response = jsonify({'error': 'Too many downloads in progress, try again later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(download_scheduler.retry_after())
+        return response
+
+    response = with_validators(flask.Response(
+        download_scheduler.stream(slot, modpack_file, start, length),
+        status=status,
+        mimetype='application/zip',
+        headers=headers,
+        direct_passthrough=True
+    ))
+    response.content_length = length
+    # Releases the slot even if the client disconnects before streaming starts
+    response.call_on_close(slot.release)
+
+    # Resumed downloads are not counted again
+    if status == 200:
+        increment_download_count(modpack_id)
+    return response
+
+def increment_download_count(modpack_id):
+    """Increase the download counter of a modpack."""
+    try:
+        download_counter.increment(modpack_id)
+    except OSError:
+        logger.exception("Error saving download counts")
 
 # Create default icon if it doesn't exist
 def create_default_icon():
@@ -165,96 +388,248 @@ def create_default_icon():
         
         # Save the image
         img.save(icon_path)
-        print(f"Created default icon at {icon_path}")
+        logger.info("Created default icon at %s", icon_path)
         
     except ImportError:
         # If PIL is not available, create a simple colored square
         with open(icon_path, 'wb') as f:
             # Basic PNG file with a pink square (minimal valid PNG)
             f.write(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x80\x00\x00\x00\x80\x08\x02\x00\x00\x00L\\\xf6\x9c\x00\x00\x00\x19IDAT\x18W\xed\xc1\x01\x01\x00\x00\x00\x82 \xff\xafnH@\x01\x00\x00\x00\x00\xef\x06\x10 \x00\x01\x89Q\xc9\xb0\x00\x00\x00\x00IEND\xaeB`\x82')
-            print(f"Created simple default icon at {icon_path}")
+            logger.info("Created simple default icon at %s", icon_path)
+
+# Mod sources in priority order; unconfigured ones are skipped
+mod_sources = load_sources([name.strip() for name in
+                            os.environ.get('MOD_SOURCES', 'local,modrinth,curseforge').split(',') if name.strip()])
+modrinth_client = mod_sources.get('modrinth') or ModrinthClient.from_env()
+dependency_resolver = DependencyResolver(mod_sources)
+MOD_SEARCH_DEADLINE = float(os.environ.get('MOD_SEARCH_DEADLINE', 2))
 
-# Initialize client
-modrinth_client = ModrinthClient()
+# Admission control and bandwidth shaping for modpack downloads
+download_scheduler = DownloadScheduler(
+    max_concurrent=int(os.environ.get('DOWNLOAD_MAX_CONCURRENT', 32)),
+    max_per_client=int(os.environ.get('DOWNLOAD_MAX_PER_CLIENT', 2)),
+    max_queue=int(os.environ.get('DOWNLOAD_MAX_QUEUE', 64)),
+    queue_timeout=float(os.environ.get('DOWNLOAD_QUEUE_TIMEOUT', 2)),
+    global_rate=int(os.environ.get('DOWNLOAD_RATE_LIMIT', 0)),  # bytes/s, 0 is unlimited
+    client_rate=int(os.environ.get('DOWNLOAD_CLIENT_RATE_LIMIT', 0))
+)
+_server_model_checked = False
+
+@app.before_request
+def check_server_model():
+    """Warn once if the server handles one request at a time per worker."""
+    global _server_model_checked
+    if _server_model_checked:
+        return
+    _server_model_checked = True
+    if not request.environ.get('wsgi.multithread'):
+        # Each download then holds the whole worker, so the slot and bandwidth caps
+        # are never reached and throttled downloads block every other request
+        logger.warning("Running on a single-threaded worker; download limits need threaded "
+                       "or async workers (e.g. gunicorn --threads 8 or -k gevent)")
+
+# Verification of stored artifacts against their recorded hashes. Passes are
+# serialised across worker processes by a lock next to the shared state file.
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+hash_cache = integrity.HashCache(os.environ.get('HASH_CACHE_PATH', os.path.join(CACHE_FOLDER, 'hash_cache.json')))
+scrubber = integrity.Scrubber(
+    UPLOAD_FOLDER, load_modpacks, hash_cache,
+    bytes_per_second=int(os.environ.get('SCRUB_BYTES_PER_SECOND', 20 * 1024 * 1024)),
+    batch_size=int(os.environ.get('SCRUB_BATCH_SIZE', 50)),
+    interval=int(os.environ.get('SCRUB_INTERVAL', 3600)),
+    state_path=os.environ.get('SCRUB_STATE_PATH', os.path.join(CACHE_FOLDER, 'scrubber.json'))
+)
+if os.environ.get('SCRUB_ENABLED', '').lower() in ('1', 'true', 'yes'):
+    scrubber.start()
+
+# Optional local index answering mod searches without a Modrinth round trip
+mod_index = None
+if os.environ.get('MOD_INDEX_ENABLED', '').lower() in ('1', 'true', 'yes'):
+    mod_index = ModIndex(
+        modrinth_client,
+        path=os.environ.get('MOD_INDEX_PATH', os.path.join(CACHE_FOLDER, 'mod_index.json')),
+        max_projects=int(os.environ.get('MOD_INDEX_MAX_PROJECTS', 5000)),
+        refresh_interval=int(os.environ.get('MOD_INDEX_REFRESH_INTERVAL', 6 * 3600))
+    )
+    mod_index.load()
+    mod_index.start()
+
+
+def search_sources():
+    """Get the sources to search, answering Modrinth from the local index when enabled."""
+    sources = dict(mod_sources)
+    if mod_index and 'modrinth' in sources:
+        sources['modrinth'] = mod_index
+    return sources
 
 @app.route('/')
 def index():
     """Main page."""
-    modpacks = load_modpacks()
+    modpacks = list_catalog()
     return render_template('index.html', modpacks=modpacks)
 
 @app.route('/admin')
 @auth.login_required
 def admin_panel():
     """Admin panel."""
-    modpacks = load_modpacks()
+    modpacks = list_catalog()
     return render_template('admin.html', modpacks=modpacks)
 
 @app.route('/admin/create-modpack')
 @auth.login_required
 def create_modpack_page():
     """Modpack creation page."""
-    print("Rendering create_modpack.html template")
     try:
         return render_template('create_modpack.html')
     except Exception as e:
-        print(f"ERROR rendering create_modpack.html: {str(e)}")
+        logger.exception("Error rendering create_modpack.html")
         # Return a simple error message if template is missing
         return f"Error: {str(e)}", 500
 
 @app.route('/api/modpacks', methods=['GET'])
 def get_modpacks():
     """Get all modpacks."""
-    modpacks = load_modpacks()
-    return jsonify(modpacks)
+    return jsonify(list_catalog())
 
 @app.route('/api/modpacks/<modpack_id>', methods=['GET'])
 def get_modpack(modpack_id):
     """Get a specific modpack."""
-    modpacks = load_modpacks()
-    for modpack in modpacks:
-        if modpack['id'] == modpack_id:
-            return jsonify(modpack)
-    abort(404)
+    entry = get_catalog_index().get(modpack_id)
+    if entry is None:
+        abort(404)
+    modpack = dict(entry['modpack'])
+    modpack['download_count'] = modpack.get('download_count', 0) + download_counter.counts().get(modpack_id, 0)
+    return jsonify(modpack)
+
+@app.route('/api/modpacks/sync', methods=['POST'])
+def sync_modpacks():
+    """
+    Check many installed modpacks for updates in one request.
+
+    Body: {"packs": [{"id": ..., "version": ..., "version_id": ..., "file_hash": ...}]}
+    Only modpacks that changed or no longer exist are returned. Entries without
+    a string or numeric id are reported by position under "rejected".
+    """
+    data = request.get_json(silent=True) or {}
+    packs = data.get('packs')
+    if not isinstance(packs, list):
+        return jsonify({'error': 'No packs provided'}), 400
+
+    index = get_catalog_index()
+    updated = []
+    removed = []
+    rejected = []
+    for position, pack in enumerate(packs):
+        pack_id = pack.get('id') if isinstance(pack, dict) else None
+        if isinstance(pack_id, bool) or not isinstance(pack_id, (str, int, float)):
+            rejected.append(position)
+            continue
+        entry = index.get(str(pack_id))
+        if entry is None:
+            removed.append(pack_id)
+            continue
+
+        modpack = entry['modpack']
+        if pack.get('file_hash'):
+            changed = pack['file_hash'] != modpack.get('file_hash')
+        elif pack.get('version_id'):
+            changed = pack['version_id'] != modpack.get('version_id')
+        else:
+            changed = pack.get('version') != modpack.get('version')
+        if not changed:
+            continue
+
+        # The installed build is still stored, so the launcher can diff against it
+        from_version_id = entry['version_hashes'].get(pack.get('file_hash'))
+        if from_version_id is None and pack.get('version_id') in entry['version_hashes'].values():
+            from_version_id = pack['version_id']
+
+        updated.append({
+            'id': modpack['id'],
+            'version': modpack.get('version'),
+            'version_id': modpack.get('version_id'),
+            'file_hash': modpack.get('file_hash'),
+            'file_size': modpack.get('file_size'),
+            'download_url': modpack.get('download_url'),
+            'delta_available': from_version_id is not None,
+            'from_version_id': from_version_id
+        })
+
+    return jsonify({
+        'updated': updated,
+        'removed': removed,
+        'rejected': rejected,
+        'unchanged': len(packs) - len(updated) - len(removed) - len(rejected)
+    })
 
 @app.route('/api/mods/search', methods=['GET'])
 def search_mods():
-    """Search for mods from Modrinth."""
+    """Search for mods in every enabled source concurrently."""
     query = request.args.get('query', '')
     mc_version = request.args.get('mc_version', '')
     modloader = request.args.get('modloader', '')
     
-    print(f"Search request: query='{query}', mc_version='{mc_version}', modloader='{modloader}'")
-    
     if not query:
-        print("Empty query, returning empty results")
         return jsonify([])
-    
+
     try:
-        results = modrinth_client.search_mods(query, mc_version, modloader)
-        print(f"Found {len(results)} results")
+        results = federated_search(search_sources(), 'search_mods', query, mc_version, modloader,
+                                   deadline=MOD_SEARCH_DEADLINE)
         return jsonify(results)
     except Exception as e:
-        print(f"Error in search_mods: {str(e)}")
+        logger.exception("Error in search_mods")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/mods/popular', methods=['GET'])
 def get_popular_mods():
-    """Get popular mods from Modrinth."""
+    """Get popular mods from every enabled source."""
     mc_version = request.args.get('mc_version', '')
     modloader = request.args.get('modloader', '')
     limit = int(request.args.get('limit', 20))
     
-    print(f"Getting popular mods (MC: {mc_version}, Modloader: {modloader})")
-    
     try:
-        results = modrinth_client.get_popular_mods(mc_version, modloader, limit)
-        print(f"Found {len(results)} popular mods")
+        results = federated_search(mod_sources, 'get_popular_mods', mc_version, modloader,
+                                   deadline=MOD_SEARCH_DEADLINE, limit=limit)
         return jsonify(results)
     except Exception as e:
-        print(f"Error in get_popular_mods: {str(e)}")
+        logger.exception("Error in get_popular_mods")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/mods/resolve', methods=['POST'])
+def resolve_mods():
+    """Resolve the dependencies of a list of mods for a game version and loader."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('mods'):
+        return jsonify({'error': 'No mods provided'}), 400
+    error = validate_mods(data['mods'])
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        result = dependency_resolver.resolve(data['mods'], data.get('mc_version', ''), data.get('modloader', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.exception("Error resolving mods")
+        return jsonify({"error": str(e)}), 502
+
+    # Only the details the UI needs, not the whole version objects
+    for mod in result['mods']:
+        version = mod.pop('version')
+        mod['version_id'] = version['id']
+        mod['version_number'] = version['version_number']
+    return jsonify(result)
+
+@app.route('/api/mods/status', methods=['GET'])
+def get_mod_source_status():
+    """Get the health of every enabled mod source."""
+    return jsonify({
+        'sources': {name: source.status() for name, source in mod_sources.items()},
+        'index': mod_index.status() if mod_index else None
+    })
+
 @app.route('/api/debug/search', methods=['GET'])
 def debug_search_mods():
     """Debug route for mod searching."""
@@ -266,8 +641,7 @@ def debug_search_mods():
             "results": result
         })
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in debug search")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/debug/search', methods=['GET'])
@@ -313,267 +687,371 @@ def upload_modpack():
         modpack_info = extract_modpack_info(temp_path)
         modpack_id = modpack_info['id']
         
-        # Check if modpack already exists
-        modpacks = load_modpacks()
-        for i, modpack in enumerate(modpacks):
-            if modpack['id'] == modpack_id:
-                # Update existing modpack
-                modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
-                if os.path.exists(modpack_dir):
-                    shutil.rmtree(modpack_dir)
-                    
-                modpacks[i]['version'] = modpack_info['version']
-                modpacks[i]['mc_versions'] = modpack_info['mc_versions']
-                modpacks[i]['updated_at'] = datetime.now().isoformat()
-                modpacks[i]['mod_count'] = modpack_info['mod_count']
-                break
-        else:
-            # Add new modpack
-            new_modpack = {
-                'id': modpack_id,
-                'name': modpack_info['name'],
+        # Stage the new version next to the current one
+        staging_dir = modpack_store.create_staging_dir(UPLOAD_FOLDER, modpack_id)
+        try:
+            modpack_file = os.path.join(staging_dir, f"{modpack_id}.zip")
+            shutil.copy(temp_path, modpack_file)
+
+            # Save icon if present
+            if modpack_info.get('icon_data'):
+                with open(os.path.join(staging_dir, f"icon{modpack_info['icon_ext']}"), 'wb') as f:
+                    f.write(modpack_info['icon_data'])
+
+            version_info = {
                 'version': modpack_info['version'],
                 'mc_versions': modpack_info['mc_versions'],
-                'author': modpack_info['author'],
-                'description': modpack_info['description'],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat(),
-                'download_count': 0,
-                'mod_count': modpack_info['mod_count']
+                'mod_count': modpack_info['mod_count'],
+                'file_size': os.path.getsize(modpack_file),
+                'file_hash': calculate_file_hash(modpack_file)
             }
-            modpacks.append(new_modpack)
-            
-        # Save modpack file
-        modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
-        os.makedirs(modpack_dir, exist_ok=True)
-        
-        modpack_file = os.path.join(modpack_dir, f"{modpack_id}.zip")
-        shutil.copy(temp_path, modpack_file)
-        
-        # Save icon if present
-        if modpack_info.get('icon_file'):
-            icon_ext = os.path.splitext(modpack_info['icon_file'])[1]
-            icon_path = os.path.join(modpack_dir, f"icon{icon_ext}")
-            shutil.copy(modpack_info['icon_file'], icon_path)
-            
-            # Update icon URL in metadata
-            for modpack in modpacks:
-                if modpack['id'] == modpack_id:
-                    modpack['icon_url'] = f"/api/modpacks/{modpack_id}/icon"
-                    break
-        
-        # Calculate file size and hash
-        file_size = os.path.getsize(modpack_file)
-        file_hash = calculate_file_hash(modpack_file)
-        
-        # Update metadata
-        for modpack in modpacks:
-            if modpack['id'] == modpack_id:
-                modpack['file_size'] = file_size
-                modpack['file_hash'] = file_hash
-                modpack['download_url'] = f"/api/modpacks/{modpack_id}/download"
-                break
-        
-        # Save modpack metadata
-        save_modpacks(modpacks)
+
+            # The pointer and the catalog change together
+            with modpack_store.catalog_lock(UPLOAD_FOLDER):
+                record = publish_version(modpack_id, staging_dir, version_info)
+
+                # Check if modpack already exists
+                modpacks = load_modpacks()
+                for modpack in modpacks:
+                    if modpack['id'] == modpack_id:
+                        break
+                else:
+                    # Add new modpack
+                    modpack = {
+                        'id': modpack_id,
+                        'name': modpack_info['name'],
+                        'version': modpack_info['version'],
+                        'mc_versions': modpack_info['mc_versions'],
+                        'author': modpack_info['author'],
+                        'description': modpack_info['description'],
+                        'created_at': datetime.now().isoformat(),
+                        'updated_at': datetime.now().isoformat(),
+                        'download_count': 0,
+                        'mod_count': modpack_info['mod_count']
+                    }
+                    modpacks.append(modpack)
+
+                apply_version_record(modpack, record)
+
+                # Save modpack metadata
+                save_modpacks(modpacks)
+        finally:
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir)
+
+        refresh_static_export()
         
-        return jsonify({'success': True, 'id': modpack_id})
+        logger.info("Uploaded modpack", extra={'modpack_id': modpack_id, 'version_id': record['version_id']})
+        return jsonify({'success': True, 'id': modpack_id, 'warnings': modpack_info['warnings']})
         
     except Exception as e:
+        logger.warning("Rejected modpack upload: %s", e)
         return jsonify({'error': str(e)}), 400
     finally:
         # Clean up
         shutil.rmtree(temp_dir)
 
+def validate_mods(mods):
+    """Validate a list of requested mods. Returns an error message or None."""
+    if not isinstance(mods, list):
+        return 'mods must be a list'
+    for mod in mods:
+        if not isinstance(mod, dict) or not isinstance(mod.get('id'), str) or not mod['id']:
+            return 'Every mod must be an object with an id'
+        if mod.get('source') is not None and not isinstance(mod['source'], str):
+            return 'Mod source must be a string'
+    return None
+
+def validate_modpack_data(data):
+    """Validate a modpack creation request. Returns an error message or None."""
+    if not data:
+        return 'No data provided'
+    if not isinstance(data, dict):
+        return 'Invalid modpack data'
+        
+    # Validate required fields
+    required_fields = ['id', 'name', 'version', 'mc_versions', 'author', 'description', 'mods', 'modloader']
+    for field in required_fields:
+        if field not in data:
+            return f'Missing required field: {field}'
+            
+    # Add validation for modpack ID (no special characters)
+    modpack_id = data['id']
+    if not isinstance(modpack_id, str) or not modpack_id.replace('_', '').replace('-', '').isalnum():
+        return 'Modpack ID should only contain letters, numbers, underscores or hyphens'
+
+    if not isinstance(data['mc_versions'], list) or not isinstance(data['mods'], list):
+        return 'mc_versions and mods must be lists'
+
+    # Validate mods list is not empty
+    if len(data['mods']) == 0:
+        return 'Modpack must contain at least one mod'
+    return validate_mods(data['mods'])
+
+def get_uploaded_logo():
+    """Get the logo uploaded with a creation request and its extension."""
+    if 'logo' in request.files and request.files['logo'].filename:
+        logo_file = request.files['logo']
+        logo_ext = os.path.splitext(logo_file.filename)[1].lower()
+        if logo_ext not in ['.png', '.jpg', '.jpeg', '.gif']:
+            raise ValueError('Logo must be PNG, JPG or GIF format')
+        return logo_file, logo_ext
+    return None, None
+
+def build_modpack_entries(data, icon_name=None, icon_source=None):
+    """
+    Prepare the manifest and archive entries of a modpack.
+
+    Mods and their required dependencies are resolved up front; raises
+    ValueError if any is unavailable or the set contains incompatible mods.
+    Mod files are only downloaded when the archive is written, straight from
+    Modrinth into the zip.
+    """
+    # Prepare manifest
+    manifest = {
+        'id': data['id'],
+        'name': data['name'],
+        'version': data['version'],
+        'mc_versions': data['mc_versions'],
+        'author': data['author'],
+        'description': data['description'],
+        'modloader': data['modloader'],
+        'mods': []
+    }
+    
+    # Add logo path to manifest if logo was uploaded
+    if icon_name:
+        manifest['icon_path'] = icon_name
+
+    mc_version = data['mc_versions'][0] if data['mc_versions'] else None
+    resolution = dependency_resolver.resolve(data['mods'], mc_version, data['modloader'])
+    if resolution['missing'] or resolution['conflicts']:
+        raise ValueError(describe_problems(resolution))
+
+    mod_entries = []
+    for mod in resolution['mods']:
+        version = mod['version']
+        mod_file = ModSource.primary_file(version)
+        if not mod_file:
+            raise ValueError(f"No downloadable file for mod {mod['name']}")
+        file_name = secure_filename(mod_file['filename'])
+
+        manifest['mods'].append({
+            'id': mod['id'],
+            'source': mod['source'],
+            'name': mod['name'],
+            'version': version['version_number'],
+            'version_id': version['id'],
+            'mc_versions': version['game_versions'],
+            'file_name': file_name,
+            'sha1': mod_file.get('hashes', {}).get('sha1'),
+            'dependencies': mod['dependencies']
+        })
+        mod_entries.append(zip_stream.ZipEntry(
+            f"mods/{file_name}", mod_sources[mod['source']].stream_file(mod_file['url']), mod_file.get('size')))
+
+    entries = [zip_stream.ZipEntry('manifest.json', json.dumps(manifest, indent=2).encode('utf-8'))]
+    if icon_name:
+        entries.append(zip_stream.ZipEntry(icon_name, icon_source))
+    entries.extend(mod_entries)
+    return manifest, entries
+
 @app.route('/api/modpacks/create', methods=['POST'])
 @auth.login_required
 def create_modpack():
     """Create a modpack from the web interface."""
-    temp_dir = None
+    staging_dir = None
     try:
         # Get JSON data from the form
         data = json.loads(request.form.get('data', '{}'))
-        print(f"Received modpack creation request: {data['name']} (ID: {data.get('id', 'unknown')})")
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-            
-        # Validate required fields
-        required_fields = ['id', 'name', 'version', 'mc_versions', 'author', 'description', 'mods', 'modloader']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-                
-        # Add validation for modpack ID (no special characters)
+        error = validate_modpack_data(data)
+        if error:
+            return jsonify({'error': error}), 400
+        logger.info("Received modpack creation request", extra={'modpack_id': data['id'], 'mod_total': len(data['mods'])})
         modpack_id = data['id']
-        if not modpack_id.isalnum() and not '_' in modpack_id and not '-' in modpack_id:
-            return jsonify({'error': 'Modpack ID should only contain letters, numbers, underscores or hyphens'}), 400
 
-        # Validate mods list is not empty
-        if len(data['mods']) == 0:
-            return jsonify({'error': 'Modpack must contain at least one mod'}), 400
-        
-        # Create temporary directory for building the modpack
-        temp_dir = tempfile.mkdtemp()
-        print(f"Created temp directory at: {temp_dir}")
-        
-        # Create mods directory
-        mods_dir = os.path.join(temp_dir, 'mods')
-        os.makedirs(mods_dir, exist_ok=True)
-        
-        # Process logo if it was uploaded
-        logo_path = None
-        if 'logo' in request.files and request.files['logo'].filename:
-            logo_file = request.files['logo']
-            # Save the logo to the temp directory
-            logo_ext = os.path.splitext(logo_file.filename)[1].lower()
-            if logo_ext not in ['.png', '.jpg', '.jpeg', '.gif']:
-                return jsonify({'error': 'Logo must be PNG, JPG or GIF format'}), 400
-                
-            logo_path = os.path.join(temp_dir, f"icon{logo_ext}")
-            logo_file.save(logo_path)
-            print(f"Saved uploaded logo to {logo_path}")
-        
-        # Prepare manifest
-        manifest = {
-            'id': data['id'],
-            'name': data['name'],
-            'version': data['version'],
-            'mc_versions': data['mc_versions'],
-            'author': data['author'],
-            'description': data['description'],
-            'modloader': data['modloader'],
-            'mods': []
-        }
-        
-        # Add logo path to manifest if logo was uploaded
-        if logo_path:
-            manifest['icon_path'] = os.path.basename(logo_path)
-        
-        # Download mods
-        print(f"Starting download of {len(data['mods'])} mods")
-        for mod in data['mods']:
-            mod_id = mod['id']
-            print(f"Processing mod {mod.get('name', 'unknown')} ({mod_id})")
-            
-            # Rest of the mod download code...
-            # ...
-        
-        # Write manifest to file
-        manifest_path = os.path.join(temp_dir, 'manifest.json')
-        with open(manifest_path, 'w') as f:
-            json.dump(manifest, f, indent=2)
-        
-        # Create ZIP file
-        modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
-        os.makedirs(modpack_dir, exist_ok=True)
+        try:
+            logo_file, logo_ext = get_uploaded_logo()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        modpack_zip = os.path.join(modpack_dir, f"{modpack_id}.zip")
-        print(f"Creating ZIP archive at {modpack_zip}")
-        
-        with zipfile.ZipFile(modpack_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add manifest
-            zipf.write(manifest_path, os.path.basename(manifest_path))
-            
-            # Add logo if present
-            if logo_path:
-                zipf.write(logo_path, os.path.basename(logo_path))
-                
-                # Also save the logo directly to the modpack directory for icon API
-                icon_ext = os.path.splitext(logo_path)[1]
-                icon_dest = os.path.join(modpack_dir, f"icon{icon_ext}")
-                shutil.copy(logo_path, icon_dest)
-            
-            # Add mods
-            for mod_file in os.listdir(mods_dir):
-                mod_path = os.path.join(mods_dir, mod_file)
-                zipf.write(mod_path, os.path.join('mods', mod_file))
-                
-        print(f"✅ Created modpack ZIP at {modpack_zip}")
+        # The archive is written straight into a staging directory for the new version
+        os.makedirs(os.path.join(UPLOAD_FOLDER, modpack_id), exist_ok=True)
+        staging_dir = modpack_store.create_staging_dir(UPLOAD_FOLDER, modpack_id)
+
+        # Keep the logo next to the zip for the icon API
+        icon_name = None
+        icon_path = None
+        if logo_file:
+            icon_name = f"icon{logo_ext}"
+            icon_path = os.path.join(staging_dir, icon_name)
+            logo_file.save(icon_path)
+
+        manifest, entries = build_modpack_entries(data, icon_name, icon_path)
         
-        # Update modpack metadata
-        modpacks = load_modpacks()
-        for i, modpack in enumerate(modpacks):
-            if modpack['id'] == modpack_id:
-                modpacks[i]['version'] = data['version']
-                modpacks[i]['mc_versions'] = data['mc_versions']
-                modpacks[i]['updated_at'] = datetime.now().isoformat()
-                modpacks[i]['mod_count'] = len(manifest['mods'])
-                if logo_path:
-                    modpacks[i]['icon_url'] = f"/api/modpacks/{modpack_id}/icon"
-                break
-        else:
-            # Add new modpack
-            new_modpack = {
-                'id': modpack_id,
-                'name': data['name'],
+        modpack_zip = os.path.join(staging_dir, f"{modpack_id}.zip")
+        with open(modpack_zip, 'wb') as f:
+            file_size = zip_stream.write_zip(f, entries)
+        # Written seekably so jars can be stored, the hash is taken from the file
+        file_hash = calculate_file_hash(modpack_zip)
+
+        # The pointer and the catalog change together
+        with modpack_store.catalog_lock(UPLOAD_FOLDER):
+            record = publish_version(modpack_id, staging_dir, {
                 'version': data['version'],
                 'mc_versions': data['mc_versions'],
-                'author': data['author'],
-                'description': data['description'],
-                'modloader': data['modloader'],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat(),
-                'download_count': 0,
                 'mod_count': len(manifest['mods']),
-                'download_url': f"/api/modpacks/{modpack_id}/download",
-                'file_size': os.path.getsize(modpack_zip),
-                'file_hash': calculate_file_hash(modpack_zip)
-            }
-            if logo_path:
-                new_modpack['icon_url'] = f"/api/modpacks/{modpack_id}/icon"
-            modpacks.append(new_modpack)
-            
-        # Save modpack metadata
-        save_modpacks(modpacks)
+                'file_size': file_size,
+                'file_hash': file_hash
+            })
+
+            # Update modpack metadata
+            modpacks = load_modpacks()
+            for modpack in modpacks:
+                if modpack['id'] == modpack_id:
+                    break
+            else:
+                # Add new modpack
+                modpack = {
+                    'id': modpack_id,
+                    'name': data['name'],
+                    'version': data['version'],
+                    'mc_versions': data['mc_versions'],
+                    'author': data['author'],
+                    'description': data['description'],
+                    'modloader': data['modloader'],
+                    'created_at': datetime.now().isoformat(),
+                    'updated_at': datetime.now().isoformat(),
+                    'download_count': 0,
+                    'mod_count': len(manifest['mods'])
+                }
+                modpacks.append(modpack)
+
+            apply_version_record(modpack, record)
+
+            # Save modpack metadata
+            save_modpacks(modpacks)
+        refresh_static_export()
         
-        print(f"✅ Successfully created modpack '{data['name']}' (ID: {modpack_id})")
+        logger.info("Created modpack", extra={'modpack_id': modpack_id, 'version_id': record['version_id'], 'file_size': file_size})
         return jsonify({'success': True, 'id': modpack_id})
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except (UpstreamUnavailable, requests.RequestException) as e:
+        logger.warning("Mod source unavailable while creating modpack: %s", e)
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        import traceback
-        print(f"❌ Error creating modpack: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error creating modpack")
         return jsonify({'error': str(e)}), 500
     finally:
         # Clean up
-        if temp_dir and os.path.exists(temp_dir):
-            print(f"Cleaning up temp directory: {temp_dir}")
-            shutil.rmtree(temp_dir)
+        if staging_dir and os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+
+@app.route('/api/modpacks/build', methods=['POST'])
+@auth.login_required
+def build_modpack():
+    """Assemble a modpack and stream it back without storing it."""
+    try:
+        data = json.loads(request.form.get('data', '{}'))
+    except json.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid modpack data: {e}'}), 400
+    error = validate_modpack_data(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        logo_file, logo_ext = get_uploaded_logo()
+        icon_name = f"icon{logo_ext}" if logo_file else None
+        icon_source = logo_file.read() if logo_file else None
+        manifest, entries = build_modpack_entries(data, icon_name, icon_source)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        logger.warning("Mod source unavailable while building modpack: %s", e)
+        return jsonify({'error': str(e)}), 503
+
+    return flask.Response(
+        flask.stream_with_context(zip_stream.iter_zip(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{data["id"]}.zip"'}
+    )
 
 @app.route('/api/modpacks/<modpack_id>/download', methods=['GET'])
 def download_modpack(modpack_id):
-    """Download a modpack."""
-    modpack_file = os.path.join(UPLOAD_FOLDER, modpack_id, f"{modpack_id}.zip")
-    if not os.path.exists(modpack_file):
+    """Download the current version of a modpack."""
+    # Serve the version the catalog advertises, so the file matches its file_hash
+    entry = get_catalog_index().get(modpack_id)
+    version_id = entry['modpack'].get('version_id') if entry else None
+    modpack_file = None
+    file_hash = None
+    if version_id:
+        modpack_file = modpack_store.artifact_path(UPLOAD_FOLDER, modpack_id, version_id)
+        file_hash = entry['modpack'].get('file_hash')
+    if not modpack_file:
+        # Unversioned files have no trustworthy recorded hash, they get a weak ETag
+        modpack_file = modpack_store.artifact_path(UPLOAD_FOLDER, modpack_id)
+        file_hash = None
+    if not modpack_file:
         abort(404)
         
-    # Update download count
-    modpacks = load_modpacks()
-    for modpack in modpacks:
-        if modpack['id'] == modpack_id:
-            modpack['download_count'] += 1
-            save_modpacks(modpacks)
-            break
-            
-    return send_file(modpack_file, as_attachment=True)
+    return send_modpack_file(modpack_id, modpack_file, f"{modpack_id}.zip", file_hash)
+
+@app.route('/api/modpacks/<modpack_id>/versions', methods=['GET'])
+def get_modpack_versions(modpack_id):
+    """List the stored versions of a modpack."""
+    versions = modpack_store.list_versions(UPLOAD_FOLDER, modpack_id)
+    if not versions:
+        abort(404)
+    for version in versions:
+        version['download_url'] = f"/api/modpacks/{modpack_id}/versions/{version['version_id']}/download"
+    return jsonify(versions)
+
+@app.route('/api/modpacks/<modpack_id>/versions/<version_id>/download', methods=['GET'])
+def download_modpack_version(modpack_id, version_id):
+    """Download a specific version of a modpack."""
+    modpack_file = modpack_store.artifact_path(UPLOAD_FOLDER, modpack_id, version_id)
+    if not modpack_file:
+        abort(404)
+
+    record = modpack_store.get_version(UPLOAD_FOLDER, modpack_id, version_id) or {}
+    return send_modpack_file(modpack_id, modpack_file, f"{modpack_id}-{version_id}.zip", record.get('file_hash'))
+
+@app.route('/api/modpacks/<modpack_id>/rollback', methods=['POST'])
+@auth.login_required
+def rollback_modpack(modpack_id):
+    """Make a previously published version the current one."""
+    data = request.get_json(silent=True) or {}
+    version_id = data.get('version_id')
+    if not version_id:
+        return jsonify({'error': 'No version_id provided'}), 400
+
+    with modpack_store.catalog_lock(UPLOAD_FOLDER):
+        modpacks = load_modpacks()
+        for modpack in modpacks:
+            if modpack['id'] == modpack_id:
+                break
+        else:
+            abort(404)
+
+        try:
+            record = modpack_store.set_current_version(UPLOAD_FOLDER, modpack_id, version_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 404
+
+        apply_version_record(modpack, record)
+        save_modpacks(modpacks)
+    refresh_static_export()
+
+    return jsonify({'success': True, 'id': modpack_id, 'version_id': version_id})
 
 @app.route('/api/modpacks/<modpack_id>/icon', methods=['GET'])
 def get_modpack_icon(modpack_id):
     """Get modpack icon."""
-    modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
-    if not os.path.exists(modpack_dir):
-        # Return default icon
-        default_icon = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'default-icon.png')
-        if os.path.exists(default_icon):
-            return send_file(default_icon)
-        abort(404)
-        
-    # Find icon file
-    for filename in os.listdir(modpack_dir):
-        if filename.startswith('icon'):
-            icon_path = os.path.join(modpack_dir, filename)
-            return send_file(icon_path)
+    icon_path = modpack_store.icon_path(UPLOAD_FOLDER, modpack_id)
+    if icon_path:
+        return send_file(icon_path)
             
     # No icon found, return default
     default_icon = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'default-icon.png')
@@ -586,23 +1064,72 @@ def get_modpack_icon(modpack_id):
 @auth.login_required
 def delete_modpack(modpack_id):
     """Delete a modpack."""
-    modpacks = load_modpacks()
-    for i, modpack in enumerate(modpacks):
-        if modpack['id'] == modpack_id:
-            # Remove from list
-            del modpacks[i]
-            
-            # Delete files
-            modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
-            if os.path.exists(modpack_dir):
-                shutil.rmtree(modpack_dir)
-                
-            # Save modpack metadata
-            save_modpacks(modpacks)
-            
-            return jsonify({'success': True})
-            
-    abort(404)
+    with modpack_store.catalog_lock(UPLOAD_FOLDER):
+        modpacks = load_modpacks()
+        for i, modpack in enumerate(modpacks):
+            if modpack['id'] == modpack_id:
+                break
+        else:
+            abort(404)
+
+        # Remove from list
+        del modpacks[i]
+
+        # Delete files
+        modpack_dir = os.path.join(UPLOAD_FOLDER, modpack_id)
+        if os.path.exists(modpack_dir):
+            shutil.rmtree(modpack_dir)
+
+        # Save modpack metadata
+        save_modpacks(modpacks)
+    download_counter.forget(modpack_id)
+    refresh_static_export()
+
+    return jsonify({'success': True})
+
+@app.cli.command('export-static')
+def export_static_command():
+    """Export the catalog and artifacts to STATIC_EXPORT_FOLDER."""
+    if not STATIC_EXPORT_FOLDER:
+        print("Set STATIC_EXPORT_FOLDER to the directory to export to")
+        return
+    result = refresh_static_export()
+    if result:
+        print(f"Exported {result['packs']} modpacks to {STATIC_EXPORT_FOLDER} "
+              f"({result['copied']} copied, {result['skipped']} unchanged, {result['removed']} removed)")
+
+@app.cli.command('scrub')
+@click.option('--full', is_flag=True, help='Re-read every file instead of the next batch.')
+def scrub_command(full):
+    """Run one storage integrity pass, e.g. from cron."""
+    checked = scrubber.run_pass(full=full)
+    if checked is None:
+        print("Another integrity pass is running")
+        return
+    report = scrubber.report()
+    print(f"Checked {checked} files, {len(report['problems'])} problems")
+    for problem in report['problems']:
+        print(f"{problem['status']}: {problem['path']}")
+
+@app.route('/api/admin/downloads', methods=['GET'])
+@auth.login_required
+def get_download_metrics():
+    """Get download scheduler load and counters."""
+    return jsonify(download_scheduler.metrics())
+
+@app.route('/api/admin/integrity', methods=['GET'])
+@auth.login_required
+def get_integrity_report():
+    """Get the results of the storage integrity checks."""
+    return jsonify(scrubber.report())
+
+@app.route('/api/admin/integrity/scrub', methods=['POST'])
+@auth.login_required
+def trigger_scrub():
+    """Start an integrity check in the background."""
+    data = request.get_json(silent=True) or {}
+    scrubber.trigger(full=bool(data.get('full')))
+    return jsonify({'success': True}), 202
 
 @app.route('/static/<path:filename>')
 def static_files(filename):
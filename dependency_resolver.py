@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dependency resolution and compatibility checks for modpacks.
+
+``DependencyResolver`` expands a list of requested projects into the
+full set of mods a pack needs for one Minecraft version and loader, pulling in
+missing required dependencies and reporting incompatible or unavailable mods.
+The version picked for each (source, project, Minecraft version, loader) is memoized
+across builds, so packs sharing mods do not repeat the upstream lookups.
+
+``check_manifest`` validates the ``dependencies`` and ``mc_versions`` already
+recorded in an uploaded pack's manifest without contacting any mod source.
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyResolver:
+    """Resolves mod dependency graphs against one or more mod sources."""
+
+    def __init__(self, sources, default_source='modrinth', cache_ttl=3600):
+        """``sources`` maps source names to ModSource instances."""
+        self.sources = sources
+        self.default_source = default_source
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._projects_by_version = {}
+
+    def _source(self, name):
+        source = self.sources.get(name or self.default_source)
+        if source is None:
+            raise ValueError(f"Unknown mod source: {name}")
+        return source
+
+    def resolve_version(self, project_id, mc_version, loader, source=None):
+        """
+        Get the newest version of a project compatible with the Minecraft
+        version and loader, or None if there is none. Results are memoized.
+        """
+        source = source or self.default_source
+        key = (source, project_id, mc_version, loader)
+        with self._lock:
+            cached = self._versions.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+
+        # Upstream errors propagate so they are never memoized as "incompatible"
+        versions = self._source(source).get_mod_versions(project_id, mc_version, loader, raise_errors=True)
+        version = next((v for v in versions if self._is_compatible(v, mc_version, loader)), None)
+
+        with self._lock:
+            self._versions[key] = (time.monotonic(), version)
+            if version:
+                self._projects_by_version[(source, version['id'])] = project_id
+        return version
+
+    def project_for_version(self, version_id, source=None):
+        """Get the project a version id belongs to."""
+        source = source or self.default_source
+        with self._lock:
+            project_id = self._projects_by_version.get((source, version_id))
+        if project_id:
+            return project_id
+
+        version = self._source(source).get_version(version_id)
+        if not version:
+            return None
+        with self._lock:
+            self._projects_by_version[(source, version_id)] = version['project_id']
+        return version['project_id']
+
+    @staticmethod
+    def _is_compatible(version, mc_version, loader):
+        # An empty list means the version does not restrict it
+        game_versions = version.get('game_versions') or []
+        loaders = version.get('loaders') or []
+        if mc_version and game_versions and mc_version not in game_versions:
+            return False
+        if loader and loaders and loader not in loaders:
+            return False
+        return True
+
+    def resolve(self, mods, mc_version, loader):
+        """
+        Resolve the dependency graph of a pack.
+
+        ``mods`` is a list of dicts with at least an ``id`` (project id) and
+        optionally the ``source`` it comes from. Dependencies are looked up
+        in the same source as the mod requiring them. Returns a dict with:
+
+        - ``mods``: resolved mods, dependencies before dependents
+        - ``added``: project ids pulled in as required dependencies
+        - ``missing``: project ids with no version for this game version/loader
+        - ``conflicts``: pairs of included projects declared incompatible
+        """
+        requested = {(mod.get('source') or self.default_source, mod['id']): mod for mod in mods}
+        pending = list(requested)
+        resolved = {}
+        edges = {}
+        incompatible = []
+        missing = []
+        added = []
+
+        while pending:
+            node = pending.pop(0)
+            if node in resolved or node in missing:
+                continue
+            source, project_id = node
+
+            version = self.resolve_version(project_id, mc_version, loader, source)
+            if version is None:
+                missing.append(node)
+                continue
+            resolved[node] = version
+            edges[node] = []
+
+            for dependency in version.get('dependencies', []):
+                dep_type = dependency.get('dependency_type')
+                if dep_type not in ('required', 'incompatible'):
+                    continue
+                dep_project = dependency.get('project_id')
+                if not dep_project and dependency.get('version_id'):
+                    dep_project = self.project_for_version(dependency['version_id'], source)
+                if not dep_project or dep_project == project_id:
+                    continue
+                dep_node = (source, dep_project)
+
+                if dep_type == 'incompatible':
+                    incompatible.append((node, dep_node))
+                    continue
+
+                edges[node].append(dep_node)
+                if dep_node not in requested and dep_node not in added:
+                    added.append(dep_node)
+                pending.append(dep_node)
+
+        conflicts = [
+            {'mod': a[1], 'incompatible_with': b[1]}
+            for a, b in incompatible if a in resolved and b in resolved
+        ]
+
+        result_mods = []
+        for node in self._dependency_order(edges):
+            source, project_id = node
+            version = resolved[node]
+            mod = requested.get(node, {})
+            result_mods.append({
+                'id': project_id,
+                'source': source,
+                'name': mod.get('name', project_id),
+                'version': version,
+                'dependencies': [dep[1] for dep in edges[node] if dep in resolved],
+                'required_by': sorted(p[1] for p, deps in edges.items() if node in deps),
+                'added': node not in requested
+            })
+
+        result = {
+            'mods': result_mods,
+            'added': [node[1] for node in added],
+            'missing': [node[1] for node in missing],
+            'conflicts': conflicts
+        }
+        if missing or conflicts:
+            logger.info("Unresolved pack dependencies",
+                        extra={'missing': result['missing'], 'conflicts': conflicts})
+        return result
+
+    @staticmethod
+    def _dependency_order(edges):
+        """Order projects so dependencies come before their dependents."""
+        order = []
+        visited = set()
+
+        def visit(node, path):
+            if node in visited or node in path or node not in edges:
+                return
+            path.add(node)
+            for dependency in edges[node]:
+                visit(dependency, path)
+            path.discard(node)
+            visited.add(node)
+            order.append(node)
+
+        for node in edges:
+            visit(node, set())
+        return order
+
+    def clear(self):
+        """Forget all memoized versions."""
+        with self._lock:
+            self._versions.clear()
+            self._projects_by_version.clear()
+
+
+def describe_problems(result):
+    """Build a readable error message from a resolution result."""
+    problems = []
+    if result['missing']:
+        problems.append(f"No compatible version for: {', '.join(result['missing'])}")
+    for conflict in result['conflicts']:
+        problems.append(f"{conflict['mod']} is incompatible with {conflict['incompatible_with']}")
+    return '; '.join(problems)
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
+def _dependency_id(dependency):
+    """Get the project id of a required dependency, or None to skip it."""
+    if isinstance(dependency, str):
+        return dependency
+    if isinstance(dependency, dict) and dependency.get('dependency_type', 'required') == 'required':
+        project_id = dependency.get('project_id') or dependency.get('id')
+        return str(project_id) if project_id else None
+    return None
+
+
+def check_manifest(manifest):
+    """
+    Check the mods listed in a pack manifest against each other.
+
+    Returns a list of human-readable problems: dependencies that are not part
+    of the pack and mods that do not support every Minecraft version of the
+    pack. Dependencies may be project ids or Modrinth-style objects; entries
+    that are neither are ignored, since this only produces warnings.
+    """
+    problems = []
+    mods = [mod for mod in _as_list(manifest.get('mods')) if isinstance(mod, dict)]
+    mod_ids = {str(mod['id']) for mod in mods if mod.get('id') is not None}
+    pack_versions = {str(v) for v in _as_list(manifest.get('mc_versions'))}
+
+    for mod in mods:
+        name = mod.get('name', mod.get('id', 'unknown'))
+        for dependency in _as_list(mod.get('dependencies')):
+            dependency_id = _dependency_id(dependency)
+            if dependency_id and dependency_id not in mod_ids:
+                problems.append(f"{name} requires {dependency_id}, which is not in the pack")
+
+        mod_versions = _as_list(mod.get('mc_versions'))
+        if mod_versions and pack_versions:
+            unsupported = sorted(pack_versions - {str(v) for v in mod_versions})
+            if unsupported:
+                problems.append(f"{name} does not support Minecraft {', '.join(unsupported)}")
+    return problems
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Download scheduling for modpack files.
+
+``DownloadScheduler`` caps how many downloads run at once, globally and per
+client, and shapes their bandwidth with token buckets so large pack downloads
+cannot starve the rest of the API on the same workers. Requests that cannot
+get a slot within a short wait are turned away with a ``Retry-After`` hint
+instead of tying up a worker.
+"""
+
+import os
+import time
+import threading
+
+
+class TokenBucket:
+    """Thread-safe token bucket measured in bytes."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take ``amount`` tokens and return how long to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(float(self.capacity), self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative queues the caller behind earlier reservations
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class DownloadSlot:
+    """A granted download; must be released exactly once."""
+
+    def __init__(self, scheduler, client_id):
+        self.scheduler = scheduler
+        self.client_id = client_id
+        self.started_at = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.scheduler._release(self)
+
+
+class DownloadScheduler:
+    """Admission control and bandwidth shaping for file downloads."""
+
+    def __init__(self, max_concurrent=32, max_per_client=2, max_queue=64, queue_timeout=2.0,
+                 global_rate=0, client_rate=0, chunk_size=256 * 1024):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.chunk_size = chunk_size
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._queued = 0
+        self._per_client = {}
+        self._client_buckets = {}
+        self._stats = {
+            'started': 0, 'completed': 0, 'rejected': 0,
+            'bytes_sent': 0, 'throttled_seconds': 0.0, 'total_duration': 0.0
+        }
+
+    def acquire(self, client_id):
+        """Wait briefly for a download slot. Returns a DownloadSlot or None if saturated."""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            if self._queued >= self.max_queue:
+                self._stats['rejected'] += 1
+                return None
+
+            self._queued += 1
+            try:
+                while (self._active >= self.max_concurrent or
+                       self._per_client.get(client_id, 0) >= self.max_per_client):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['rejected'] += 1
+                        return None
+                    self._condition.wait(remaining)
+            finally:
+                self._queued -= 1
+
+            self._active += 1
+            self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+            if self.client_rate and client_id not in self._client_buckets:
+                self._client_buckets[client_id] = TokenBucket(self.client_rate)
+            self._stats['started'] += 1
+            return DownloadSlot(self, client_id)
+
+    def _release(self, slot):
+        with self._condition:
+            self._active -= 1
+            count = self._per_client.get(slot.client_id, 1) - 1
+            if count > 0:
+                self._per_client[slot.client_id] = count
+            else:
+                self._per_client.pop(slot.client_id, None)
+                self._client_buckets.pop(slot.client_id, None)
+            self._stats['completed'] += 1
+            self._stats['total_duration'] += time.monotonic() - slot.started_at
+            self._condition.notify_all()
+
+    def retry_after(self):
+        """Estimate in whole seconds when a slot is likely to free up."""
+        with self._condition:
+            completed = self._stats['completed']
+            average = self._stats['total_duration'] / completed if completed else 10.0
+            backlog = self._active + self._queued
+        return max(1, int(average * backlog / max(self.max_concurrent, 1)))
+
+    def stream(self, slot, path, start=0, length=None):
+        """Yield a byte range of a file at the shaped rate, releasing the slot when done."""
+        client_bucket = self._client_buckets.get(slot.client_id)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = length if length is not None else os.path.getsize(path) - start
+                while remaining > 0:
+                    chunk = f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    wait = 0.0
+                    if self.global_bucket:
+                        wait = self.global_bucket.reserve(len(chunk))
+                    if client_bucket:
+                        wait = max(wait, client_bucket.reserve(len(chunk)))
+                    if wait > 0:
+                        time.sleep(wait)
+                    remaining -= len(chunk)
+                    with self._condition:
+                        self._stats['bytes_sent'] += len(chunk)
+                        self._stats['throttled_seconds'] += wait
+                    yield chunk
+        finally:
+            slot.release()
+
+    def metrics(self):
+        """Get current load and lifetime counters."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'active': self._active,
+                'queued': self._queued,
+                'clients': len(self._per_client),
+                'max_concurrent': self.max_concurrent,
+                'max_per_client': self.max_per_client,
+                'global_rate': self.global_bucket.rate if self.global_bucket else None,
+                'client_rate': self.client_rate or None
+            })
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        stats['total_duration'] = round(stats['total_duration'], 3)
+        return stats
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Storage integrity checks for stored modpack artifacts.
+
+``hash_file`` hashes files with large mmap or buffered reads. ``HashCache``
+remembers the hash of each file keyed by its path, mtime and size so
+unchanged files are not re-read. ``Scrubber`` walks every stored artifact in
+small throttled batches, compares it with the hash recorded at upload time
+and keeps a report of mismatches for the admin API. Passes are serialised by
+a file lock and their progress is saved to disk, so with several worker
+processes only one scrubs at a time and every worker sees the same report.
+"""
+
+import os
+import json
+import mmap
+import time
+import hashlib
+import threading
+import logging
+import modpack_store
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 8 * 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+class IOThrottle:
+    """Limits read throughput to a number of bytes per second."""
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self._start = time.monotonic()
+        self._consumed = 0
+
+    def consume(self, size):
+        """Account for ``size`` bytes read, sleeping if ahead of the allowed rate."""
+        if not self.bytes_per_second:
+            return
+        self._consumed += size
+        expected = self._consumed / self.bytes_per_second
+        elapsed = time.monotonic() - self._start
+        if expected > elapsed:
+            time.sleep(expected - elapsed)
+
+
+def hash_file(path, throttle=None):
+    """Calculate the SHA-256 hash of a file using large reads."""
+    sha256_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, READ_SIZE):
+                        with view[offset:offset + READ_SIZE] as chunk:
+                            sha256_hash.update(chunk)
+                            if throttle:
+                                throttle.consume(len(chunk))
+        else:
+            for block in iter(lambda: f.read(READ_SIZE), b''):
+                sha256_hash.update(block)
+                if throttle:
+                    throttle.consume(len(block))
+    return sha256_hash.hexdigest()
+
+
+class HashCache:
+    """Persistent map of (path, mtime, size) to SHA-256 hash."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Merge the saved cache, keeping the most recently verified entry of each file."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error loading hash cache: %s", e)
+            return
+        with self._lock:
+            for path, entry in saved.items():
+                current = self._entries.get(path)
+                if current is None or entry.get('verified_at', 0) > current.get('verified_at', 0):
+                    self._entries[path] = entry
+
+    def lookup(self, path):
+        """Get the cache entry of a file if it has not changed since it was hashed."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry
+        return None
+
+    def get_hash(self, path, throttle=None):
+        """Get the hash of a file, reading it only if it changed."""
+        entry = self.lookup(path)
+        if entry:
+            return entry['hash']
+        return self.update(path, throttle)
+
+    def update(self, path, throttle=None):
+        """Re-hash a file and store the result."""
+        stat = os.stat(path)
+        file_hash = hash_file(path, throttle)
+        with self._lock:
+            self._entries[path] = {
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'hash': file_hash,
+                'verified_at': time.time()
+            }
+            self._dirty = True
+        return file_hash
+
+    def prune(self, keep_paths):
+        """Forget files that are no longer stored."""
+        with self._lock:
+            for path in list(self._entries):
+                if path not in keep_paths:
+                    del self._entries[path]
+                    self._dirty = True
+
+    def save(self):
+        """Persist the cache if it changed."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._entries)
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        modpack_store.atomic_write_json(self.path, entries, indent=None)
+
+
+class Scrubber:
+    """
+    Incrementally verifies stored artifacts against their recorded hashes.
+
+    Each pass checks at most ``batch_size`` files, continuing where the last
+    pass stopped. Files that changed on disk are always re-read; unchanged
+    files are re-read once their last verification is older than
+    ``reverify_interval`` to catch silent corruption.
+    """
+
+    def __init__(self, base_folder, load_modpacks, cache, bytes_per_second=20 * 1024 * 1024,
+                 batch_size=50, interval=3600, reverify_interval=7 * 24 * 3600, state_path=None):
+        self.base_folder = base_folder
+        self.load_modpacks = load_modpacks
+        self.cache = cache
+        self.bytes_per_second = bytes_per_second
+        self.batch_size = batch_size
+        self.interval = interval
+        self.reverify_interval = reverify_interval
+        # Cursor, results and last pass, shared by every process using the same path
+        self.state_path = state_path
+        self.lock_path = f"{state_path}.lock" if state_path else None
+
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._results = {}
+        self._last_pass = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._full_requested = False
+        self._running = False
+
+    def targets(self):
+        """List every stored artifact with the hash it should have."""
+        targets = []
+        for modpack in self.load_modpacks():
+            modpack_id = modpack['id']
+            versions = modpack_store.list_versions(self.base_folder, modpack_id)
+            for record in versions:
+                path = os.path.join(modpack_store.version_dir(self.base_folder, modpack_id, record['version_id']),
+                                    f"{modpack_id}.zip")
+                targets.append({'path': path, 'modpack_id': modpack_id, 'version_id': record['version_id'],
+                                'expected_hash': record.get('file_hash'), 'expected_size': record.get('file_size')})
+            if not versions:
+                path = os.path.join(self.base_folder, modpack_id, f"{modpack_id}.zip")
+                targets.append({'path': path, 'modpack_id': modpack_id, 'version_id': None,
+                                'expected_hash': modpack.get('file_hash'), 'expected_size': modpack.get('file_size')})
+        targets.sort(key=lambda t: t['path'])
+        return targets
+
+    @staticmethod
+    def _result(target, actual_hash, actual_size):
+        """Compare a file's hash and size with what was recorded for it."""
+        result = dict(target, checked_at=time.time(), actual_hash=actual_hash, actual_size=actual_size)
+        if target['expected_size'] is not None and actual_size != target['expected_size']:
+            result['status'] = 'mismatch'
+        elif target['expected_hash'] and actual_hash != target['expected_hash']:
+            result['status'] = 'mismatch'
+        else:
+            result['status'] = 'ok'
+        return result
+
+    def _verify(self, target, throttle):
+        """Re-read a file and compare it with its recorded hash."""
+        path = target['path']
+        if not os.path.exists(path):
+            return dict(target, checked_at=time.time(), status='missing')
+        try:
+            actual_size = os.path.getsize(path)
+            actual_hash = self.cache.update(path, throttle)
+        except OSError as e:
+            return dict(target, checked_at=time.time(), status='error', error=str(e))
+        return self._result(target, actual_hash, actual_size)
+
+    def _load_state(self):
+        """Pick up the progress saved by the last pass, whichever process ran it."""
+        if self._running or not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Error loading scrubber state: %s", e)
+            return
+        with self._lock:
+            self._cursor = state.get('cursor', 0)
+            self._results = state.get('results', {})
+            self._last_pass = state.get('last_pass')
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            state = {'cursor': self._cursor, 'results': self._results, 'last_pass': self._last_pass}
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        modpack_store.atomic_write_json(self.state_path, state, indent=None)
+
+    def is_due(self):
+        """Check whether the last pass, by any process, is older than the interval."""
+        self._load_state()
+        with self._lock:
+            last_pass = self._last_pass
+        return last_pass is None or time.time() - last_pass['at'] >= self.interval
+
+    def run_pass(self, full=False, only_if_due=False):
+        """
+        Verify the next batch of artifacts (all of them if ``full``).
+
+        Returns the number of files read, or None if another process is
+        scrubbing or, with ``only_if_due``, a pass ran recently.
+        """
+        if not self.lock_path:
+            return self._run_pass(full)
+        with modpack_store.file_lock(self.lock_path, blocking=False) as acquired:
+            if not acquired:
+                logger.debug("Skipping integrity pass, another one is running")
+                return None
+            if only_if_due and not self.is_due():
+                return None
+            self._load_state()
+            self.cache.load()
+            self._running = True
+            try:
+                checked = self._run_pass(full)
+            finally:
+                self._running = False
+            self._save_state()
+            return checked
+
+    def _run_pass(self, full):
+        targets = self.targets()
+        throttle = IOThrottle(self.bytes_per_second)
+        checked = 0
+
+        with self._lock:
+            start = 0 if full else self._cursor
+        next_cursor = start
+        for offset in range(len(targets)):
+            position = (start + offset) % len(targets)
+            target = targets[position]
+
+            entry = None if full else self.cache.lookup(target['path'])
+            if entry and time.time() - entry.get('verified_at', 0) < self.reverify_interval:
+                # Unchanged and recently read: judge from the cached hash without I/O
+                result = self._result(target, entry['hash'], entry['size'])
+            else:
+                if not full and checked >= self.batch_size:
+                    break
+                result = self._verify(target, throttle)
+                checked += 1
+            next_cursor = position + 1
+
+            if result['status'] != 'ok':
+                logger.warning("Integrity check failed", extra={
+                    'path': target['path'], 'status': result['status'], 'modpack_id': target['modpack_id']})
+            with self._lock:
+                self._results[target['path']] = result
+
+        live_paths = {t['path'] for t in targets}
+        with self._lock:
+            self._cursor = next_cursor % len(targets) if targets else 0
+            self._results = {p: r for p, r in self._results.items() if p in live_paths}
+            self._last_pass = {'at': time.time(), 'checked': checked, 'full': full, 'targets': len(targets)}
+        self.cache.prune(live_paths)
+        self.cache.save()
+        return checked
+
+    def report(self):
+        """Summarise the latest verification results."""
+        self._load_state()
+        with self._lock:
+            results = list(self._results.values())
+            last_pass = self._last_pass
+        problems = [r for r in results if r['status'] != 'ok']
+        return {
+            'last_pass': last_pass,
+            'verified': sum(1 for r in results if r['status'] == 'ok'),
+            'problems': sorted(problems, key=lambda r: r['path'])
+        }
+
+    def trigger(self, full=False):
+        """Run a pass as soon as possible in the background."""
+        if self._thread is None:
+            # Scrubbing is not scheduled in this process, run a one-off pass
+            threading.Thread(target=self._run_once, args=(full,), name='scrubber-once', daemon=True).start()
+            return
+        with self._lock:
+            self._full_requested = self._full_requested or full
+        self._wake.set()
+
+    def _run_once(self, full, only_if_due=False):
+        try:
+            self.run_pass(full=full, only_if_due=only_if_due)
+        except Exception:
+            logger.exception("Error scrubbing storage")
+
+    def _run(self):
+        triggered = False
+        while True:
+            with self._lock:
+                full = self._full_requested
+                self._full_requested = False
+            # Scheduled passes are skipped when another process ran one recently
+            self._run_once(full, only_if_due=not triggered)
+            with self._lock:
+                last_pass = self._last_pass
+            wait = self.interval
+            if last_pass:
+                wait = min(max(last_pass['at'] + self.interval - time.time(), min(60, self.interval)), self.interval)
+            triggered = self._wake.wait(wait)
+            self._wake.clear()
+
+    def start(self):
+        """Start scrubbing in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='scrubber', daemon=True)
+            self._thread.start()
@@ -2,22 +2,328 @@
 # -*- coding: utf-8 -*-
 
 """
-API client for the Modrinth mod repository.
+Mod sources the server can search and download mods from.
+
+Every source implements ``ModSource`` and registers itself by name with
+``register_source``: Modrinth, a CurseForge-style API and a local directory
+repository that works fully offline. ``federated_search`` queries several
+sources concurrently, each on its own small thread pool so a stalled upstream
+cannot hold up the others, and merges their results.
 """
 
+import os
+import re
 import json
+import time
+import logging
+import zipfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
-class ModrinthClient:
-    """Client for the Modrinth API."""
-    API_BASE = "https://api.modrinth.com/v2"
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a mod source cannot be reached and nothing is cached."""
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket kept in sync with Modrinth's rate limit headers.
+
+    The bucket refills at ``limit`` requests per ``window`` seconds and is
+    corrected from ``X-Ratelimit-Limit``, ``X-Ratelimit-Remaining`` and
+    ``X-Ratelimit-Reset`` on every response.
+    """
+
+    def __init__(self, limit=300, window=60):
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(float(self.limit), self.tokens + elapsed * self.limit / self.window)
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to ``timeout`` seconds. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = max(self._blocked_until - now, (1 - self.tokens) * self.window / self.limit)
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def update(self, headers, status_code=None):
+        """Adjust the bucket from the headers of an upstream response."""
+        try:
+            limit = int(headers.get('X-Ratelimit-Limit', 0))
+            remaining = headers.get('X-Ratelimit-Remaining')
+            remaining = float(remaining) if remaining is not None else None
+            reset = float(headers.get('X-Ratelimit-Reset', 0))
+        except (TypeError, ValueError):
+            return
+
+        with self._lock:
+            if limit > 0:
+                self.limit = limit
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+            if status_code == 429 or remaining == 0:
+                self.tokens = 0.0
+                self._blocked_until = time.monotonic() + max(reset, 1.0)
+
+
+class CircuitBreaker:
+    """
+    Stops calling upstream after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens for
+    ``reset_timeout`` seconds; then a single trial request is let through and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self):
+        """Check whether a request may be sent upstream."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class ResponseCache:
+    """Small thread-safe LRU cache of decoded upstream responses."""
+
+    def __init__(self, max_entries=1024):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key, max_age=None):
+        """Get a cached value, optionally only if younger than ``max_age`` seconds."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if max_age is not None and time.monotonic() - stored_at > max_age:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Source classes by name, filled by @register_source
+SOURCE_TYPES = {}
+
+
+def register_source(cls):
+    """Class decorator making a mod source available by its name."""
+    SOURCE_TYPES[cls.name] = cls
+    return cls
+
+
+class ModSource(ABC):
+    """
+    Interface of a repository mods can be searched and downloaded from.
+
+    Search results and versions use the dict formats of ModrinthClient, with
+    an added ``source`` key holding the source name.
+    """
+    name = None
+
+    @classmethod
+    def from_env(cls):
+        """Create the source from environment settings, or None if it is not configured."""
+        return cls()
+
+    @abstractmethod
+    def search_mods(self, query, minecraft_version=None, modloader=None, limit=20):
+        """Search mods, best matches first."""
+
+    def get_popular_mods(self, minecraft_version=None, modloader=None, limit=20):
+        return []
+
+    @abstractmethod
+    def get_mod_versions(self, mod_id, minecraft_version=None, modloader=None, raise_errors=False):
+        """Get the versions of a mod, newest first."""
+
+    def get_version(self, version_id):
+        return None
+
+    @abstractmethod
+    def stream_file(self, url, chunk_size=1024 * 1024):
+        """Yield the content of a file listed in a version."""
+
+    def status(self):
+        return {}
+
+    @staticmethod
+    def primary_file(version):
+        """Get the primary file of a version returned by get_mod_versions."""
+        if not version['files']:
+            return None
+        return next((file for file in version['files'] if file.get('primary')), version['files'][0])
+
+
+class HttpModSource(ModSource):
+    """
+    Base for sources behind an HTTP API, with timeouts, a pooled session,
+    rate limiting, a circuit breaker and a response cache.
+    """
+    API_BASE = None
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 10
     
-    def __init__(self):
+    def __init__(self, pool_size=16, cache_ttl=60, rate_limit_wait=5,
+                 failure_threshold=5, reset_timeout=30):
+        self.timeout = (self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
+        self.cache_ttl = cache_ttl
+        self.rate_limit_wait = rate_limit_wait
+
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": "Project-Launcher-Server/1.0"
         })
+        # Sent with API calls only, never with file downloads from other hosts
+        self.api_headers = {}
+        # Keep enough pooled connections per host for every worker thread so
+        # concurrent requests reuse connections instead of reconnecting
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.rate_limiter = RateLimiter()
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.cache = ResponseCache()
+
+    def _get_json(self, path, params=None):
+        """
+        GET an API path and return the decoded JSON, or None on a client
+        error. Fresh results come from the cache; stale ones are served while
+        upstream is failing or rate limited.
+        """
+        key = (path, json.dumps(params or {}, sort_keys=True))
+        cached = self.cache.get(key, max_age=self.cache_ttl)
+        if cached is not None:
+            return cached
+
+        if self.circuit_breaker.state == 'open':
+            return self._stale_or_raise(key, "circuit open")
+        if not self.rate_limiter.acquire(self.rate_limit_wait):
+            return self._stale_or_raise(key, "rate limited")
+        if not self.circuit_breaker.allow_request():
+            return self._stale_or_raise(key, "circuit open")
+
+        try:
+            response = self.session.get(f"{self.API_BASE}{path}", params=params, headers=self.api_headers,
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            self.circuit_breaker.record_failure()
+            return self._stale_or_raise(key, str(e))
+
+        self.rate_limiter.update(response.headers, response.status_code)
+        if response.status_code == 429 or response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+            return self._stale_or_raise(key, f"HTTP {response.status_code}")
+
+        self.circuit_breaker.record_success()
+        if response.status_code != 200:
+            logger.warning("%s error for %s: HTTP %s", self.name, path, response.status_code)
+            return None
+
+        data = response.json()
+        self.cache.set(key, data)
+        return data
+
+    def _stale_or_raise(self, key, reason):
+        """Fall back to a cached response of any age when upstream is degraded."""
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.warning("%s degraded (%s), serving cached result", self.name, reason)
+            return cached
+        raise UpstreamUnavailable(f"{self.name} unavailable: {reason}")
+
+    def status(self):
+        """Get the health of the upstream connection."""
+        return {
+            'circuit': self.circuit_breaker.state,
+            'consecutive_failures': self.circuit_breaker.failures,
+            'rate_limit': self.rate_limiter.limit,
+            'tokens': int(self.rate_limiter.tokens)
+        }
+
+    def stream_file(self, url, chunk_size=1024 * 1024):
+        """Yield the content of a mod file without buffering it to disk."""
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                yield chunk
+
+
+@register_source
+class ModrinthClient(HttpModSource):
+    """Client for the Modrinth API."""
+    name = 'modrinth'
+    API_BASE = "https://api.modrinth.com/v2"
+
+    @classmethod
+    def from_env(cls):
+        return cls(pool_size=int(os.environ.get('MODRINTH_POOL_SIZE', 16)))
     
     def search_mods(self, query, minecraft_version=None, modloader=None, limit=20):
         """Search for mods from Modrinth."""
@@ -44,14 +350,10 @@ class ModrinthClient:
             if filters:
                 params['filter'] = ' AND '.join(filters)
             
-            print(f"Search params: {params}")
-            response = self.session.get(f"{self.API_BASE}/search", params=params)
-            
-            if response.status_code != 200:
-                print(f"Error in search: {response.text}")
+            data = self._get_json("/search", params)
+            if data is None:
                 return []
                 
-            data = response.json()
             hits = data.get('hits', [])
             
             # Format the results
@@ -62,76 +364,104 @@ class ModrinthClient:
                 'description': mod.get('description', ''),
                 'downloads': mod.get('downloads', 0),
                 'icon_url': mod.get('icon_url'),
-                'page_url': f"https://modrinth.com/mod/{mod['project_id']}"
+                'page_url': f"https://modrinth.com/mod/{mod['project_id']}",
+                'source': self.name
             } for mod in hits]
         except Exception as e:
-            print(f"Error searching mods: {str(e)}")
+            logger.error("Error searching mods: %s", e)
             return []
     
-    def get_mod_versions(self, mod_id, minecraft_version=None, modloader=None):
-        """Get versions of a mod."""
+    @staticmethod
+    def _format_version(version, mod_id=None):
+        """Convert a Modrinth version object to the format used by the server."""
+        return {
+            'id': version['id'],
+            'project_id': version.get('project_id', mod_id),
+            'version_number': version['version_number'],
+            'name': version['name'],
+            'changelog': version.get('changelog', ''),
+            'date_published': version['date_published'],
+            'game_versions': version['game_versions'],
+            'loaders': version.get('loaders', []),
+            'dependencies': version.get('dependencies', []),
+            'files': [{
+                'url': file['url'],
+                'filename': file['filename'],
+                'size': file['size'],
+                'primary': file.get('primary', False),
+                'hashes': file.get('hashes', {})
+            } for file in version['files']],
+            'source': 'modrinth'
+        }
+
+    def get_mod_versions(self, mod_id, minecraft_version=None, modloader=None, raise_errors=False):
+        """
+        Get versions of a mod, newest first.
+
+        Errors are logged and yield an empty list unless ``raise_errors`` is
+        set, for callers that must tell "no versions" apart from "unreachable".
+        """
         try:
             params = {}
             if minecraft_version:
-                params["game_versions"] = [minecraft_version]
-            
-            # Add modloader as a game version
+                params["game_versions"] = json.dumps([minecraft_version])
             if modloader:
-                if "game_versions" not in params:
-                    params["game_versions"] = []
-                params["game_versions"].append(modloader)
+                params["loaders"] = json.dumps([modloader])
                 
-            response = self.session.get(f"{self.API_BASE}/project/{mod_id}/version", params=params)
-            if response.status_code == 200:
-                versions = response.json()
-                return [{
-                    'id': version['id'],
-                    'version_number': version['version_number'],
-                    'name': version['name'],
-                    'changelog': version.get('changelog', ''),
-                    'date_published': version['date_published'],
-                    'game_versions': version['game_versions'],
-                    'files': [{
-                        'url': file['url'],
-                        'filename': file['filename'],
-                        'size': file['size'],
-                        'primary': file.get('primary', False)
-                    } for file in version['files']]
-                } for version in versions]
+            versions = self._get_json(f"/project/{mod_id}/version", params)
+            if versions is not None:
+                return [self._format_version(version, mod_id) for version in versions]
             else:
-                print(f"Error getting mod versions: {response.text}")
                 return []
         except Exception as e:
-            print(f"Error getting mod versions: {str(e)}")
+            if raise_errors:
+                raise
+            logger.error("Error getting mod versions: %s", e)
             return []
-    
+
+    def get_version(self, version_id):
+        """Get a single version by id, or None if it does not exist."""
+        version = self._get_json(f"/version/{version_id}")
+        if version is None:
+            return None
+        return self._format_version(version)
+
     def download_mod(self, version_id, download_path):
         """Download a specific mod version."""
         try:
             # Get version details
-            response = self.session.get(f"{self.API_BASE}/version/{version_id}")
-            if response.status_code != 200:
-                print(f"Error getting version: {response.text}")
+            version = self._get_json(f"/version/{version_id}")
+            if version is None:
                 return False
                 
-            version = response.json()
             primary_file = next((file for file in version['files'] if file.get('primary', True)), version['files'][0])
             
             # Download the file
-            file_response = self.session.get(primary_file['url'], stream=True)
+            file_response = self.session.get(primary_file['url'], stream=True, timeout=self.timeout)
             if file_response.status_code == 200:
-                print(f"Downloading mod to {download_path}")
                 with open(download_path, 'wb') as f:
                     for chunk in file_response.iter_content(chunk_size=8192):
                         f.write(chunk)
                 return True
             else:
-                print(f"Error downloading file: {file_response.text}")
+                logger.error("Error downloading file: HTTP %s", file_response.status_code)
                 return False
         except Exception as e:
-            print(f"Error downloading mod: {str(e)}")
+            logger.error("Error downloading mod: %s", e)
             return False
 
+    def search_projects(self, offset=0, limit=100, index='downloads'):
+        """Get a page of raw Modrinth search hits for all mods."""
+        data = self._get_json("/search", {
+            'limit': limit,
+            'offset': offset,
+            'index': index,
+            'facets': json.dumps([["project_types:mod"]])
+        })
+        if data is None:
+            return []
+        return data.get('hits', [])
+
     def get_popular_mods(self, minecraft_version=None, modloader=None, limit=20):
         """Get popular mods from Modrinth."""
         try:
@@ -156,16 +486,11 @@ class ModrinthClient:
             if filters:
                 params['filter'] = ' AND '.join(filters)
             
-            print(f"Making Modrinth request with params: {params}")
-            response = self.session.get(f"{self.API_BASE}/search", params=params)
-            
-            if response.status_code != 200:
-                print(f"Error response: {response.text}")
+            data = self._get_json("/search", params)
+            if data is None:
                 return []
                 
-            data = response.json()
             hits = data.get('hits', [])
-            print(f"Found {len(hits)} popular mods")
             
             # Format the results
             return [{
@@ -175,11 +500,390 @@ class ModrinthClient:
                 'description': mod.get('description', ''),
                 'downloads': mod.get('downloads', 0),
                 'icon_url': mod.get('icon_url'),
-                'page_url': f"https://modrinth.com/mod/{mod['project_id']}"
+                'page_url': f"https://modrinth.com/mod/{mod['project_id']}",
+                'source': self.name
             } for mod in hits]
         except Exception as e:
-            print(f"Error fetching popular mods: {str(e)}")
+            logger.error("Error fetching popular mods: %s", e)
+            return []
+
+@register_source
+class CurseForgeSource(HttpModSource):
+    """Client for the CurseForge API (or a compatible self-hosted mirror)."""
+    name = 'curseforge'
+    API_BASE = "https://api.curseforge.com/v1"
+    GAME_ID = 432  # Minecraft
+    MODS_CLASS_ID = 6
+    LOADER_TYPES = {'forge': 1, 'fabric': 4, 'quilt': 5, 'neoforge': 6}
+    RELATION_TYPES = {1: 'embedded', 2: 'optional', 3: 'required', 5: 'incompatible'}
+
+    def __init__(self, api_key, api_base=None, **kwargs):
+        super().__init__(**kwargs)
+        if api_base:
+            self.API_BASE = api_base.rstrip('/')
+        self.session.headers.update({"Accept": "application/json"})
+        self.api_headers = {"x-api-key": api_key}
+
+    @classmethod
+    def from_env(cls):
+        api_key = os.environ.get('CURSEFORGE_API_KEY')
+        if not api_key:
+            return None
+        return cls(api_key, os.environ.get('CURSEFORGE_API_BASE'))
+
+    def _search(self, query, minecraft_version, modloader, limit, sort_field):
+        params = {
+            'gameId': self.GAME_ID,
+            'classId': self.MODS_CLASS_ID,
+            'pageSize': limit,
+            'sortField': sort_field,
+            'sortOrder': 'desc'
+        }
+        if query:
+            params['searchFilter'] = query
+        if minecraft_version:
+            params['gameVersion'] = minecraft_version
+        if modloader in self.LOADER_TYPES:
+            params['modLoaderType'] = self.LOADER_TYPES[modloader]
+
+        data = self._get_json("/mods/search", params)
+        if data is None:
+            return []
+        return [{
+            'id': str(mod['id']),
+            'name': mod['name'],
+            'author': (mod.get('authors') or [{}])[0].get('name', ''),
+            'description': mod.get('summary', ''),
+            'downloads': int(mod.get('downloadCount', 0)),
+            'icon_url': (mod.get('logo') or {}).get('thumbnailUrl'),
+            'page_url': (mod.get('links') or {}).get('websiteUrl'),
+            'source': self.name
+        } for mod in data.get('data', [])]
+
+    def search_mods(self, query, minecraft_version=None, modloader=None, limit=20):
+        """Search for mods on CurseForge."""
+        try:
+            # Sort field 1 is "featured", CurseForge's relevance ordering
+            return self._search(query, minecraft_version, modloader, limit, 1)
+        except Exception as e:
+            logger.error("Error searching CurseForge: %s", e)
+            return []
+
+    def get_popular_mods(self, minecraft_version=None, modloader=None, limit=20):
+        """Get the most popular mods on CurseForge."""
+        try:
+            return self._search(None, minecraft_version, modloader, limit, 2)
+        except Exception as e:
+            logger.error("Error fetching popular CurseForge mods: %s", e)
+            return []
+
+    def _format_file(self, file):
+        game_versions = file.get('gameVersions', [])
+        return {
+            'id': str(file['id']),
+            'project_id': str(file['modId']),
+            'version_number': file.get('displayName', file['fileName']),
+            'name': file.get('displayName', file['fileName']),
+            'changelog': '',
+            'date_published': file.get('fileDate'),
+            'game_versions': [v for v in game_versions if v[:1].isdigit()],
+            'loaders': [v.lower() for v in game_versions if v.lower() in self.LOADER_TYPES],
+            'dependencies': [{
+                'project_id': str(dep['modId']),
+                'dependency_type': self.RELATION_TYPES.get(dep.get('relationType'), 'optional')
+            } for dep in file.get('dependencies', [])],
+            'files': [{
+                'url': file.get('downloadUrl'),
+                'filename': file['fileName'],
+                'size': file.get('fileLength'),
+                'primary': True,
+                'hashes': {'sha1': h['value'] for h in file.get('hashes', []) if h.get('algo') == 1}
+            }] if file.get('downloadUrl') else [],
+            'source': self.name
+        }
+
+    def get_mod_versions(self, mod_id, minecraft_version=None, modloader=None, raise_errors=False):
+        """Get files of a CurseForge mod, newest first."""
+        try:
+            params = {}
+            if minecraft_version:
+                params['gameVersion'] = minecraft_version
+            if modloader in self.LOADER_TYPES:
+                params['modLoaderType'] = self.LOADER_TYPES[modloader]
+            data = self._get_json(f"/mods/{mod_id}/files", params)
+            if data is None:
+                return []
+            files = [self._format_file(file) for file in data.get('data', [])]
+            files.sort(key=lambda f: f['date_published'] or '', reverse=True)
+            return files
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error("Error getting CurseForge files: %s", e)
+            return []
+
+
+@register_source
+class LocalModSource(ModSource):
+    """
+    Mods served from a local directory, for private or self-hosted mods.
+
+    Layout::
+
+        <root>/<project_id>/project.json            optional: name, author, description, downloads
+        <root>/<project_id>/<version>/version.json  optional: game_versions, loaders, dependencies
+        <root>/<project_id>/<version>/<file>.jar
+
+    Missing ``game_versions`` or ``loaders`` mean the version works with any.
+    Without a version.json, the loader and version are read from a
+    ``fabric.mod.json`` or ``quilt.mod.json`` inside the jar when present.
+    """
+    name = 'local'
+    URL_SCHEME = 'local://'
+
+    def __init__(self, root, rescan_interval=30):
+        self.root = os.path.abspath(root)
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._projects = {}
+        self._versions = {}
+        self._scanned_at = 0
+
+    @classmethod
+    def from_env(cls):
+        root = os.environ.get('LOCAL_MOD_REPO')
+        if not root or not os.path.isdir(root):
+            return None
+        return cls(root)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _jar_metadata(jar_path):
+        """Read loader metadata embedded in a jar."""
+        try:
+            with zipfile.ZipFile(jar_path) as jar:
+                for filename, loader in (('fabric.mod.json', 'fabric'), ('quilt.mod.json', 'quilt')):
+                    if filename in jar.namelist():
+                        data = json.loads(jar.read(filename).decode('utf-8'))
+                        if loader == 'quilt':
+                            data = data.get('quilt_loader', {})
+                        return {'loaders': [loader], 'version_number': data.get('version')}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            pass
+        return {}
+
+    def _scan(self):
+        """Rebuild the in-memory catalog if it is older than the rescan interval."""
+        with self._lock:
+            if time.monotonic() - self._scanned_at < self.rescan_interval:
+                return
+            projects = {}
+            versions = {}
+            for project_id in sorted(os.listdir(self.root)):
+                project_dir = os.path.join(self.root, project_id)
+                if not os.path.isdir(project_dir):
+                    continue
+                meta = self._read_json(os.path.join(project_dir, 'project.json'))
+                project_versions = []
+                for version_name in os.listdir(project_dir):
+                    version_dir = os.path.join(project_dir, version_name)
+                    if not os.path.isdir(version_dir):
+                        continue
+                    jars = sorted(f for f in os.listdir(version_dir) if f.endswith('.jar'))
+                    if not jars:
+                        continue
+                    jar_path = os.path.join(version_dir, jars[0])
+                    info = self._read_json(os.path.join(version_dir, 'version.json')) or self._jar_metadata(jar_path)
+                    version_id = f"{project_id}/{version_name}"
+                    version = {
+                        'id': version_id,
+                        'project_id': project_id,
+                        'version_number': info.get('version_number') or version_name,
+                        'name': info.get('name', version_name),
+                        'changelog': info.get('changelog', ''),
+                        'date_published': datetime.fromtimestamp(os.path.getmtime(jar_path)).isoformat(),
+                        'game_versions': info.get('game_versions', []),
+                        'loaders': info.get('loaders', []),
+                        'dependencies': info.get('dependencies', []),
+                        'files': [{
+                            'url': f"{self.URL_SCHEME}{project_id}/{version_name}/{jar}",
+                            'filename': jar,
+                            'size': os.path.getsize(os.path.join(version_dir, jar)),
+                            'primary': i == 0,
+                            'hashes': {}
+                        } for i, jar in enumerate(jars)],
+                        'source': self.name
+                    }
+                    versions[version_id] = version
+                    project_versions.append(version)
+                if not project_versions:
+                    continue
+                project_versions.sort(key=lambda v: v['date_published'], reverse=True)
+                projects[project_id] = {
+                    'id': project_id,
+                    'name': meta.get('name', project_id),
+                    'author': meta.get('author', ''),
+                    'description': meta.get('description', ''),
+                    'downloads': meta.get('downloads', 0),
+                    'icon_url': meta.get('icon_url'),
+                    'page_url': meta.get('page_url'),
+                    'source': self.name,
+                    'versions': project_versions
+                }
+            self._projects = projects
+            self._versions = versions
+            self._scanned_at = time.monotonic()
+
+    @staticmethod
+    def _supports(version, minecraft_version, modloader):
+        if minecraft_version and version['game_versions'] and minecraft_version not in version['game_versions']:
+            return False
+        if modloader and version['loaders'] and modloader not in version['loaders']:
+            return False
+        return True
+
+    def _listing(self, project):
+        return {k: v for k, v in project.items() if k != 'versions'}
+
+    def search_mods(self, query, minecraft_version=None, modloader=None, limit=20):
+        """Search local mods by name, id and description."""
+        self._scan()
+        terms = re.findall(r'[a-z0-9]+', (query or '').lower())
+        results = []
+        for project in self._projects.values():
+            if not any(self._supports(v, minecraft_version, modloader) for v in project['versions']):
+                continue
+            haystack = f"{project['id']} {project['name']} {project['description']}".lower()
+            if all(term in haystack for term in terms):
+                # Name matches rank above description matches
+                score = sum(2 if term in project['name'].lower() else 1 for term in terms)
+                results.append((score, project['downloads'], project['id']))
+        results.sort(reverse=True)
+        return [self._listing(self._projects[pid]) for _, _, pid in results[:limit]]
+
+    def get_popular_mods(self, minecraft_version=None, modloader=None, limit=20):
+        """Get local mods ordered by their recorded download counts."""
+        self._scan()
+        projects = [p for p in self._projects.values()
+                    if any(self._supports(v, minecraft_version, modloader) for v in p['versions'])]
+        projects.sort(key=lambda p: p['downloads'], reverse=True)
+        return [self._listing(p) for p in projects[:limit]]
+
+    def get_mod_versions(self, mod_id, minecraft_version=None, modloader=None, raise_errors=False):
+        """Get versions of a local mod, newest first."""
+        self._scan()
+        project = self._projects.get(mod_id)
+        if not project:
             return []
+        return [v for v in project['versions'] if self._supports(v, minecraft_version, modloader)]
+
+    def get_version(self, version_id):
+        self._scan()
+        return self._versions.get(version_id)
+
+    def stream_file(self, url, chunk_size=1024 * 1024):
+        """Yield the content of a local mod file."""
+        if not url.startswith(self.URL_SCHEME):
+            raise ValueError(f"Not a local mod URL: {url}")
+        path = os.path.abspath(os.path.join(self.root, url[len(self.URL_SCHEME):]))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid local mod path: {url}")
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def status(self):
+        self._scan()
+        return {'root': self.root, 'projects': len(self._projects)}
+
+
+def load_sources(names):
+    """
+    Create the configured sources, in priority order.
+
+    ``names`` is a list of registered source names; sources that are not
+    configured in the environment are skipped.
+    """
+    sources = {}
+    for name in names:
+        cls = SOURCE_TYPES.get(name)
+        if cls is None:
+            logger.warning("Unknown mod source: %s", name)
+            continue
+        source = cls.from_env()
+        if source is not None:
+            sources[name] = source
+    return sources
+
+
+# Searches in flight per source; calls beyond this queue and are cancelled at the deadline
+SEARCH_WORKERS_PER_SOURCE = 4
+
+# One pool per source, so a stalled upstream only exhausts its own threads
+_search_executors = {}
+_search_executors_lock = threading.Lock()
+
+
+def _search_executor(name):
+    with _search_executors_lock:
+        executor = _search_executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS_PER_SOURCE,
+                                          thread_name_prefix=f'mod-search-{name}')
+            _search_executors[name] = executor
+        return executor
+
+
+def _dedup_key(result):
+    return re.sub(r'[^a-z0-9]', '', (result.get('name') or '').lower())
+
+
+def federated_search(sources, method, *args, deadline=2.0, limit=20):
+    """
+    Call ``method`` (e.g. ``'search_mods'``) on every source concurrently.
+
+    Sources that have not answered within ``deadline`` seconds are skipped
+    and their calls cancelled if they have not started yet.
+    Results are interleaved by rank in source priority order and mods listed
+    by several sources are kept once, from the highest priority source.
+    """
+    futures = {
+        name: _search_executor(name).submit(getattr(source, method), *args, limit=limit)
+        for name, source in sources.items()
+    }
+    done, _ = wait(futures.values(), timeout=deadline)
+
+    ranked = []
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            logger.warning("Mod source %s missed the search deadline", name)
+            continue
+        try:
+            ranked.append(future.result())
+        except Exception as e:
+            logger.error("Error searching mod source %s: %s", name, e)
+
+    merged = []
+    seen = set()
+    for rank in range(max((len(r) for r in ranked), default=0)):
+        for results in ranked:
+            if rank >= len(results):
+                continue
+            key = _dedup_key(results[rank])
+            if key and key in seen:
+                continue
+            seen.add(key)
+            merged.append(results[rank])
+    return merged[:limit]
+
 
 if __name__ == "__main__":
     # Simple test to verify functionality 
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Versioned on-disk storage for modpack artifacts.
+
+Every published build of a modpack lives in its own immutable directory and a
+small pointer file selects the version that is currently served:
+
+    modpacks/<id>/versions/<version_id>/<id>.zip
+    modpacks/<id>/versions/<version_id>/icon.<ext>
+    modpacks/<id>/versions/<version_id>/version.json
+    modpacks/<id>/current.json
+
+New versions are written to a staging directory and renamed into place, and
+the pointer is replaced atomically, so the served file never disappears while
+an update or rollback is in progress. ``catalog_lock`` serialises changes to
+the pointers and the catalog across threads and worker processes.
+"""
+
+import os
+import json
+import uuid
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialised
+    fcntl = None
+
+VERSIONS_DIR = 'versions'
+CURRENT_FILE = 'current.json'
+VERSION_FILE = 'version.json'
+STAGING_PREFIX = '.staging-'
+STAGING_MAX_AGE = 24 * 3600  # Staging directories older than this were left by a crash
+LOCK_FILE = '.catalog.lock'
+COUNTS_FILE = 'download_counts.json'
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def atomic_write_json(path, data, indent=4):
+    """Write JSON to a file by replacing it atomically."""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Hold an exclusive lock on ``path`` across threads and worker processes.
+
+    Yields whether the lock was acquired, which is always True when blocking.
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+    if not thread_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                acquired = False
+            else:
+                acquired = True
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        thread_lock.release()
+
+
+@contextmanager
+def catalog_lock(base_folder):
+    """
+    Hold the exclusive lock on a storage folder.
+
+    Changing which version is current and saving the catalog must happen
+    under this lock so the two never disagree.
+    """
+    with file_lock(os.path.join(base_folder, LOCK_FILE)):
+        yield
+
+
+def _read_json(path):
+    """Read a JSON file, returning None if it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def modpack_dir(base_folder, modpack_id):
+    """Get the storage directory of a modpack."""
+    return os.path.join(base_folder, modpack_id)
+
+
+def version_dir(base_folder, modpack_id, version_id):
+    """Get the directory holding a specific version of a modpack."""
+    return os.path.join(base_folder, modpack_id, VERSIONS_DIR, version_id)
+
+
+def is_valid_version_id(version_id):
+    """Check that a version id is safe to use as a directory name."""
+    return bool(version_id) and secure_filename(version_id) == version_id
+
+
+def make_version_id(version, file_hash):
+    """Build a content-addressed version id from a version string and hash."""
+    label = secure_filename(str(version)) or 'v'
+    return f"{label}-{file_hash[:12]}"
+
+
+def sweep_staging_dirs(base_folder, modpack_id, max_age=STAGING_MAX_AGE):
+    """Delete staging directories of a modpack left behind by crashed builds."""
+    directory = modpack_dir(base_folder, modpack_id)
+    if not os.path.isdir(directory):
+        return []
+
+    removed = []
+    cutoff = time.time() - max_age
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        try:
+            if filename.startswith(STAGING_PREFIX) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(filename)
+        except OSError:
+            continue
+    return removed
+
+
+def create_staging_dir(base_folder, modpack_id):
+    """Create an empty staging directory next to the modpack's versions."""
+    sweep_staging_dirs(base_folder, modpack_id)
+    staging_dir = os.path.join(base_folder, modpack_id, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.makedirs(staging_dir)
+    return staging_dir
+
+
+def remove_legacy_files(base_folder, modpack_id):
+    """
+    Delete the zip and icon of the single-file layout once the modpack has
+    a current version, which replaces them.
+    """
+    if get_current_version_id(base_folder, modpack_id) is None:
+        return []
+
+    directory = modpack_dir(base_folder, modpack_id)
+    removed = []
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path) and (filename == f"{modpack_id}.zip" or filename.startswith('icon')):
+            os.remove(path)
+            removed.append(filename)
+    return removed
+
+
+def commit_version(base_folder, modpack_id, staging_dir, info):
+    """
+    Move a staged build into its immutable version directory.
+
+    ``info`` must contain ``version``, ``file_hash`` and ``file_size`` and may
+    carry any other metadata to record (``mc_versions``, ``mod_count``...).
+    The staging directory is consumed. Returns the version record.
+    """
+    version_id = make_version_id(info['version'], info['file_hash'])
+    target_dir = version_dir(base_folder, modpack_id, version_id)
+
+    existing = get_version(base_folder, modpack_id, version_id)
+    if existing is not None:
+        # Identical content was already published under this version
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return existing
+
+    icon_file = None
+    for filename in os.listdir(staging_dir):
+        if filename.startswith('icon'):
+            icon_file = filename
+            break
+
+    record = dict(info)
+    record.update({
+        'version_id': version_id,
+        'icon_file': icon_file,
+        'created_at': datetime.now().isoformat()
+    })
+    atomic_write_json(os.path.join(staging_dir, VERSION_FILE), record)
+
+    os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+    try:
+        os.rename(staging_dir, target_dir)
+    except OSError:
+        # Another request published the same content concurrently
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        existing = get_version(base_folder, modpack_id, version_id)
+        if existing is None:
+            raise
+        return existing
+    return record
+
+
+def get_version(base_folder, modpack_id, version_id):
+    """Get the record of a specific version, or None if it does not exist."""
+    if not is_valid_version_id(version_id):
+        return None
+    return _read_json(os.path.join(version_dir(base_folder, modpack_id, version_id), VERSION_FILE))
+
+
+def get_current_version_id(base_folder, modpack_id):
+    """Get the id of the version currently served for a modpack."""
+    pointer = _read_json(os.path.join(base_folder, modpack_id, CURRENT_FILE))
+    if not pointer:
+        return None
+    return pointer.get('version_id')
+
+
+def set_current_version(base_folder, modpack_id, version_id):
+    """Point a modpack at one of its stored versions. Returns the version record."""
+    record = get_version(base_folder, modpack_id, version_id)
+    if record is None:
+        raise ValueError(f"Unknown version: {version_id}")
+    atomic_write_json(os.path.join(base_folder, modpack_id, CURRENT_FILE), {
+        'version_id': version_id,
+        'updated_at': datetime.now().isoformat()
+    })
+    return record
+
+
+def list_versions(base_folder, modpack_id):
+    """List all stored versions of a modpack, newest first."""
+    versions_root = os.path.join(base_folder, modpack_id, VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+
+    current_id = get_current_version_id(base_folder, modpack_id)
+    versions = []
+    for version_id in os.listdir(versions_root):
+        record = get_version(base_folder, modpack_id, version_id)
+        if record is None:
+            continue
+        record['current'] = version_id == current_id
+        versions.append(record)
+
+    versions.sort(key=lambda v: v.get('created_at', ''), reverse=True)
+    return versions
+
+
+def prune_versions(base_folder, modpack_id, keep):
+    """Delete the oldest non-current versions beyond the ``keep`` most recent."""
+    if keep <= 0:
+        return []
+
+    removed = []
+    for record in list_versions(base_folder, modpack_id)[keep:]:
+        if record['current']:
+            continue
+        shutil.rmtree(version_dir(base_folder, modpack_id, record['version_id']), ignore_errors=True)
+        removed.append(record['version_id'])
+    return removed
+
+
+def artifact_path(base_folder, modpack_id, version_id=None):
+    """
+    Get the zip file of a modpack version.
+
+    Without a version id the current version is used, falling back to the
+    single-file layout used before versioning was introduced.
+    """
+    if version_id is None:
+        version_id = get_current_version_id(base_folder, modpack_id)
+        if version_id is None:
+            legacy_file = os.path.join(base_folder, modpack_id, f"{modpack_id}.zip")
+            return legacy_file if os.path.exists(legacy_file) else None
+
+    if not is_valid_version_id(version_id):
+        return None
+    path = os.path.join(version_dir(base_folder, modpack_id, version_id), f"{modpack_id}.zip")
+    return path if os.path.exists(path) else None
+
+
+def icon_path(base_folder, modpack_id, version_id=None):
+    """Get the icon of a modpack version, or None if it has none."""
+    if version_id is None:
+        version_id = get_current_version_id(base_folder, modpack_id)
+
+    if version_id is not None:
+        record = get_version(base_folder, modpack_id, version_id)
+        if record and record.get('icon_file'):
+            path = os.path.join(version_dir(base_folder, modpack_id, version_id), record['icon_file'])
+            if os.path.exists(path):
+                return path
+
+    # Single-file layout keeps the icon next to the zip
+    legacy_dir = os.path.join(base_folder, modpack_id)
+    if os.path.isdir(legacy_dir):
+        for filename in os.listdir(legacy_dir):
+            if filename.startswith('icon'):
+                return os.path.join(legacy_dir, filename)
+    return None
+
+
+class DownloadCounter:
+    """
+    Download counts kept outside the catalog.
+
+    Increments are buffered in memory and added to ``download_counts.json`` at
+    most every ``flush_interval`` seconds, so counting a download never
+    rewrites modpacks.json. The counts come on top of the ``download_count``
+    recorded in the catalog.
+    """
+
+    def __init__(self, base_folder, flush_interval=5):
+        self.base_folder = base_folder
+        self.path = os.path.join(base_folder, COUNTS_FILE)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stored = {}
+        self._stored_key = None
+        self._flushed_at = time.monotonic()
+
+    def _load_stored(self):
+        """Get the flushed counts, re-reading the file only when it changed."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return {}
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stored_key:
+            self._stored = _read_json(self.path) or {}
+            self._stored_key = key
+        return self._stored
+
+    def counts(self):
+        """Get the number of counted downloads of every modpack."""
+        with self._lock:
+            counts = dict(self._load_stored())
+            for modpack_id, count in self._pending.items():
+                counts[modpack_id] = counts.get(modpack_id, 0) + count
+        return counts
+
+    def increment(self, modpack_id):
+        """Count one download, flushing buffered counts when they are due."""
+        with self._lock:
+            self._pending[modpack_id] = self._pending.get(modpack_id, 0) + 1
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self, forget=()):
+        """Add buffered counts to the counts file, dropping the modpacks in ``forget``."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._flushed_at = time.monotonic()
+        if not pending and not forget:
+            return
+
+        try:
+            with catalog_lock(self.base_folder):
+                stored = _read_json(self.path) or {}
+                for modpack_id, count in pending.items():
+                    stored[modpack_id] = stored.get(modpack_id, 0) + count
+                for modpack_id in forget:
+                    stored.pop(modpack_id, None)
+                atomic_write_json(self.path, stored, indent=None)
+        except OSError:
+            # Keep the counts for the next flush
+            with self._lock:
+                for modpack_id, count in pending.items():
+                    self._pending[modpack_id] = self._pending.get(modpack_id, 0) + count
+            raise
+
+    def forget(self, modpack_id):
+        """Drop the counts of a deleted modpack. Must not be called under ``catalog_lock``."""
+        with self._lock:
+            self._pending.pop(modpack_id, None)
+        self.flush(forget=[modpack_id])
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Structured request logging for the server.
+
+Log records are formatted as JSON lines and handed to a queue, so request
+threads never block on stdout; a single background listener does the actual
+writing. Every request gets an id (taken from ``X-Request-ID`` when present)
+that is attached to all records logged while it is handled, and one access
+record with route, status, duration and size is emitted per request, sampled
+for high-volume routes.
+"""
+
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from flask import g, request, has_request_context
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class JsonQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue records for the JSON formatter.
+
+    The stock ``prepare`` formats the record and folds the traceback into
+    ``message``; this one only renders the message and the traceback text so
+    the listener's formatter still sees them as separate fields.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Drops the traceback's frames instead of keeping them alive in the queue
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id and route to every record."""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+            if not hasattr(record, 'route'):
+                record.route = request.endpoint
+        return True
+
+
+def setup_logging(app, level='INFO', sample_rates=None, default_sample_rate=1.0, slow_request_ms=1000):
+    """
+    Route all logging through a non-blocking queue and log every request.
+
+    ``sample_rates`` maps endpoint names to the fraction of successful, fast
+    requests to log; errors and slow requests are always logged.
+    """
+    sample_rates = sample_rates or {}
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queue_handler = JsonQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Werkzeug's own access log would duplicate ours
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    access_logger = logging.getLogger('access')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        response.headers['X-Request-ID'] = g.request_id
+
+        rate = sample_rates.get(request.endpoint, default_sample_rate)
+        always = response.status_code >= 400 or duration_ms >= slow_request_ms
+        if always or rate >= 1 or random.random() < rate:
+            access_logger.info('request', extra={
+                'method': request.method,
+                'route': request.endpoint,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 2),
+                'bytes': response.content_length,
+                'remote_addr': request.remote_addr,
+                'sample_rate': 1.0 if always else rate
+            })
+        return response
+
+    return listener
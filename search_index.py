@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local full-text index of Modrinth projects.
+
+Keeps project metadata (title, description, categories, game versions,
+loaders, downloads) in memory with an inverted index so mod search can be
+answered locally within a few milliseconds per keystroke, and keeps working
+while Modrinth is unreachable. The index is refreshed periodically in a
+background thread and persisted to disk so a restart does not start empty.
+With several worker processes sharing the same file, only one refreshes it
+(under a file lock) and the others reload it when it changes.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import bisect
+import heapq
+import threading
+import logging
+import modpack_store
+
+logger = logging.getLogger(__name__)
+
+KNOWN_LOADERS = {'fabric', 'forge', 'neoforge', 'quilt', 'liteloader', 'rift', 'modloader'}
+
+# Relative weight of a token depending on where it appears
+FIELD_WEIGHTS = {'title': 3.0, 'categories': 2.0, 'author': 1.5, 'description': 1.0}
+
+# How often processes check for an index refreshed by another process
+RELOAD_INTERVAL = 300
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens."""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def project_from_hit(hit):
+    """Convert a Modrinth search hit to an index document."""
+    categories = hit.get('categories', []) + hit.get('display_categories', [])
+    return {
+        'id': hit['project_id'],
+        'name': hit['title'],
+        'author': hit.get('author', ''),
+        'description': hit.get('description', ''),
+        'categories': sorted({c for c in categories if c not in KNOWN_LOADERS}),
+        'loaders': sorted({c for c in categories if c in KNOWN_LOADERS}),
+        'game_versions': hit.get('versions', []),
+        'downloads': hit.get('downloads', 0),
+        'icon_url': hit.get('icon_url'),
+        'page_url': f"https://modrinth.com/mod/{hit['project_id']}"
+    }
+
+
+class _Snapshot:
+    """Immutable index over a fixed set of projects."""
+
+    def __init__(self, projects):
+        self.projects = {project['id']: project for project in projects}
+        postings = {}
+        for project in self.projects.values():
+            fields = {
+                'title': project['name'],
+                'categories': ' '.join(project['categories']),
+                'author': project['author'],
+                'description': project['description']
+            }
+            for field, text in fields.items():
+                for token in tokenize(text):
+                    weights = postings.setdefault(token, {})
+                    weights[project['id']] = weights.get(project['id'], 0) + FIELD_WEIGHTS[field]
+
+        self.postings = postings
+        self.tokens = sorted(postings)
+        total = max(len(self.projects), 1)
+        self.idf = {token: math.log(1 + total / len(ids)) for token, ids in postings.items()}
+
+    def _matches(self, token, prefix):
+        """Get {project_id: score} for a token, expanding prefixes for type-ahead."""
+        if not prefix:
+            weights = self.postings.get(token, {})
+            return {pid: w * self.idf[token] for pid, w in weights.items()}
+
+        scores = {}
+        start = bisect.bisect_left(self.tokens, token)
+        for candidate in self.tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            # Exact matches rank above completions
+            factor = 1.0 if candidate == token else 0.6
+            for pid, w in self.postings[candidate].items():
+                score = w * self.idf[candidate] * factor
+                if score > scores.get(pid, 0):
+                    scores[pid] = score
+        return scores
+
+    def search(self, query, mc_version=None, loader=None, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores = None
+        for i, token in enumerate(tokens):
+            matches = self._matches(token, prefix=i == len(tokens) - 1)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {pid: score + matches[pid] for pid, score in scores.items() if pid in matches}
+            if not scores:
+                return []
+
+        ranked = []
+        for pid, score in scores.items():
+            project = self.projects[pid]
+            if mc_version and mc_version not in project['game_versions']:
+                continue
+            if loader and loader not in project['loaders']:
+                continue
+            # Popularity breaks ties between similarly relevant projects
+            ranked.append((score + math.log10(project['downloads'] + 1) * 0.5, pid))
+
+        return [self.projects[pid] for _, pid in heapq.nlargest(limit, ranked)]
+
+
+class ModIndex:
+    """Thread-safe, periodically refreshed local index of Modrinth projects."""
+
+    def __init__(self, client, path=None, max_projects=5000, refresh_interval=6 * 3600):
+        self.client = client
+        self.path = path
+        self.max_projects = max_projects
+        self.refresh_interval = refresh_interval
+        self.refreshed_at = None
+        self._loaded_mtime = None
+        self._snapshot = _Snapshot([])
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self):
+        """Check whether the index holds any projects."""
+        return bool(self._snapshot.projects)
+
+    def __len__(self):
+        return len(self._snapshot.projects)
+
+    def search(self, query, mc_version=None, loader=None, limit=20):
+        """Search the index. Results use the same format as ModrinthClient.search_mods."""
+        results = self._snapshot.search(query, mc_version, loader, limit)
+        return [{
+            'id': project['id'],
+            'name': project['name'],
+            'author': project['author'],
+            'description': project['description'],
+            'downloads': project['downloads'],
+            'icon_url': project['icon_url'],
+            'page_url': project['page_url'],
+            'source': 'modrinth'
+        } for project in results]
+
+    def search_mods(self, query, minecraft_version=None, modloader=None, limit=20):
+        """Search like a mod source: the index when it has matches, else Modrinth."""
+        results = self.search(query, minecraft_version, modloader, limit) if self.ready else []
+        return results or self.client.search_mods(query, minecraft_version, modloader, limit)
+
+    def load(self):
+        """Load a previously saved index from disk."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._snapshot = _Snapshot(data['projects'])
+            self.refreshed_at = data.get('refreshed_at')
+            self._loaded_mtime = os.path.getmtime(self.path)
+            logger.info("Loaded mod index", extra={'projects': len(self)})
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Error loading mod index: %s", e)
+            return False
+
+    def save(self):
+        """Persist the index to disk."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        modpack_store.atomic_write_json(self.path, {
+            'refreshed_at': self.refreshed_at,
+            'projects': list(self._snapshot.projects.values())
+        }, indent=None)
+        self._loaded_mtime = os.path.getmtime(self.path)
+
+    def _reload_if_changed(self):
+        """Load the saved index if another process refreshed it."""
+        if self.path and os.path.exists(self.path) and os.path.getmtime(self.path) != self._loaded_mtime:
+            self.load()
+
+    def _is_due(self):
+        return not self.refreshed_at or time.time() - self.refreshed_at >= self.refresh_interval
+
+    def refresh_if_due(self):
+        """Refresh the index unless it is recent or another process is refreshing it."""
+        self._reload_if_changed()
+        if not self._is_due():
+            return False
+        if not self.path:
+            return self.refresh()
+        with modpack_store.file_lock(f"{self.path}.lock", blocking=False) as acquired:
+            if not acquired:
+                return False
+            # Another process may have finished a refresh while we waited
+            self._reload_if_changed()
+            return self._is_due() and self.refresh()
+
+    def refresh(self):
+        """Rebuild the index from Modrinth, most downloaded projects first."""
+        with self._refresh_lock:
+            projects = []
+            offset = 0
+            page_size = 100
+            while offset < self.max_projects:
+                hits = self.client.search_projects(offset=offset, limit=min(page_size, self.max_projects - offset))
+                if not hits:
+                    break
+                projects.extend(project_from_hit(hit) for hit in hits)
+                offset += len(hits)
+
+            if not projects:
+                logger.warning("Mod index refresh returned no projects, keeping current index")
+                return False
+
+            # Swapping the snapshot is atomic, searches never see a partial index
+            self._snapshot = _Snapshot(projects)
+            self.refreshed_at = time.time()
+            self.save()
+            logger.info("Refreshed mod index", extra={'projects': len(projects)})
+            return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_if_due()
+            except Exception:
+                logger.exception("Error refreshing mod index")
+            self._stop.wait(min(self.refresh_interval, RELOAD_INTERVAL))
+
+    def start(self):
+        """Start refreshing the index in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='mod-index', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            'projects': len(self),
+            'refreshed_at': self.refreshed_at,
+            'refresh_interval': self.refresh_interval
+        }
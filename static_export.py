@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Static snapshot export of the modpack catalog and artifacts.
+
+Writes a tree that can be served by nginx or any object store without the
+Flask app:
+
+    <export>/api/modpacks.json                  catalog
+    <export>/api/modpacks/<id>.json             per-modpack metadata
+    <export>/api/modpacks/<id>/versions.json    stored versions
+    <export>/files/<hash[:2]>/<hash>.zip        modpack zips, named by SHA-256
+    <export>/icons/<hash><ext>                  icons, named by SHA-256
+
+Artifacts are content-addressed, so repeated exports only copy files that are
+new and the hashed paths can be cached forever. Files under ``api/``,
+``files/`` and ``icons/`` that are no longer referenced are removed at the end
+of each export; anything else in the export directory is left alone.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import integrity
+import modpack_store
+
+# Subtrees of the export directory written, and pruned, by the exporter
+OWNED_DIRS = ('api', 'files', 'icons')
+
+# Serialises exports, across worker processes too, so one run never prunes
+# files another run is placing
+LOCK_FILE = '.export.lock'
+
+
+def _place_file(source, target):
+    """Hard link or copy a file into the export tree unless it is already there."""
+    if os.path.exists(target):
+        return False
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+    os.close(fd)
+    os.remove(temp_path)
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copy2(source, temp_path)
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+class _Exporter:
+    """Builds one snapshot and keeps track of the files it references."""
+
+    def __init__(self, source_folder, export_dir, base_url='', hash_cache=None):
+        self.source_folder = source_folder
+        self.export_dir = export_dir
+        self.base_url = base_url.rstrip('/')
+        self.hash_cache = hash_cache
+        self.referenced = set()
+        self.stats = {'packs': 0, 'copied': 0, 'skipped': 0, 'removed': 0}
+
+    def url(self, relative_path):
+        """Get the public URL of a file inside the export tree."""
+        return f"{self.base_url}/{relative_path.replace(os.sep, '/')}"
+
+    def add_file(self, source, relative_path):
+        """Add a file to the snapshot and return its public URL."""
+        self.referenced.add(relative_path)
+        if _place_file(source, os.path.join(self.export_dir, relative_path)):
+            self.stats['copied'] += 1
+        else:
+            self.stats['skipped'] += 1
+        return self.url(relative_path)
+
+    def file_hash(self, path):
+        """Hash a file's actual content, reusing cached hashes of unchanged files."""
+        if self.hash_cache is not None:
+            return self.hash_cache.get_hash(path)
+        return integrity.hash_file(path)
+
+    def add_artifact(self, source):
+        """Add a modpack zip under its content hash."""
+        file_hash = self.file_hash(source)
+        return self.add_file(source, os.path.join('files', file_hash[:2], f"{file_hash}.zip"))
+
+    def add_icon(self, source):
+        """Add an icon under its content hash."""
+        ext = os.path.splitext(source)[1].lower()
+        return self.add_file(source, os.path.join('icons', f"{self.file_hash(source)}{ext}"))
+
+    def write_json(self, relative_path, data):
+        """Write a metadata file into the snapshot."""
+        self.referenced.add(relative_path)
+        path = os.path.join(self.export_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        modpack_store.atomic_write_json(path, data, indent=None)
+
+    def export_modpack(self, modpack):
+        """Export one modpack and return its catalog entry."""
+        modpack_id = modpack['id']
+        entry = dict(modpack)
+
+        artifact = modpack_store.artifact_path(self.source_folder, modpack_id)
+        if artifact:
+            entry['download_url'] = self.add_artifact(artifact)
+
+        icon = modpack_store.icon_path(self.source_folder, modpack_id)
+        if icon:
+            entry['icon_url'] = self.add_icon(icon)
+
+        versions = []
+        for record in modpack_store.list_versions(self.source_folder, modpack_id):
+            version_artifact = modpack_store.artifact_path(self.source_folder, modpack_id, record['version_id'])
+            if not version_artifact:
+                continue
+            record['download_url'] = self.add_artifact(version_artifact)
+            versions.append(record)
+
+        self.write_json(os.path.join('api', 'modpacks', f"{modpack_id}.json"), entry)
+        if versions:
+            self.write_json(os.path.join('api', 'modpacks', modpack_id, 'versions.json'), versions)
+
+        self.stats['packs'] += 1
+        return entry
+
+    def remove_unreferenced(self):
+        """Delete files left over from previous snapshots in the exporter's own subtrees."""
+        for owned_dir in OWNED_DIRS:
+            top = os.path.join(self.export_dir, owned_dir)
+            for root, dirs, files in os.walk(top, topdown=False):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    if os.path.relpath(path, self.export_dir) not in self.referenced:
+                        os.remove(path)
+                        self.stats['removed'] += 1
+                if root != top and not os.listdir(root):
+                    os.rmdir(root)
+
+
+def load_catalog(source_folder):
+    """Read the modpack catalog of a storage folder."""
+    catalog_file = os.path.join(source_folder, 'modpacks.json')
+    if not os.path.exists(catalog_file):
+        return []
+    with open(catalog_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def export_snapshot(source_folder, export_dir, base_url='', hash_cache=None, load_modpacks=None):
+    """
+    Export the catalog and all stored artifacts to a static tree.
+
+    The catalog is read with ``load_modpacks`` (by default from
+    ``source_folder``) under the export lock, so the last export to run
+    always reflects the latest catalog. ``hash_cache`` is an optional
+    ``integrity.HashCache`` so unchanged files are not re-read to name them.
+    Returns counters describing the work done.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    with modpack_store.file_lock(os.path.join(export_dir, LOCK_FILE)):
+        modpacks = load_modpacks() if load_modpacks else load_catalog(source_folder)
+        exporter = _Exporter(source_folder, export_dir, base_url, hash_cache)
+
+        catalog = [exporter.export_modpack(modpack) for modpack in modpacks]
+        # Catalog is written last so it never references files that are not there yet
+        exporter.write_json(os.path.join('api', 'modpacks.json'), catalog)
+        exporter.remove_unreferenced()
+        return exporter.stats
+
+
+if __name__ == "__main__":
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modpacks')
+    target = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('STATIC_EXPORT_FOLDER', 'export')
+    base = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('STATIC_EXPORT_BASE_URL', '')
+
+    result = export_snapshot(source, target, base)
+    print(f"Exported {result['packs']} modpacks to {target} "
+          f"({result['copied']} copied, {result['skipped']} unchanged, {result['removed']} removed)")
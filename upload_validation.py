@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Resource-bounded validation of uploaded modpack archives.
+
+The central directory is checked first (entry count, declared sizes,
+compression ratios, unsafe paths), then every entry is decompressed as a
+stream and the real output is counted against the same limits, so a small
+archive that expands to gigabytes is rejected after reading at most the
+allowed amount and nothing is ever extracted to disk.
+"""
+
+import stat
+import zipfile
+import posixpath
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadLimits:
+    """Limits applied to an uploaded archive."""
+
+    def __init__(self, max_entries=10000, max_total_size=4 * 1024 * 1024 * 1024,
+                 max_ratio=100, ratio_min_size=1024 * 1024, max_manifest_size=1024 * 1024,
+                 max_icon_size=5 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_total_size = max_total_size
+        self.max_ratio = max_ratio
+        # Tiny entries compress extremely well legitimately; only large ones count
+        self.ratio_min_size = ratio_min_size
+        self.max_manifest_size = max_manifest_size
+        self.max_icon_size = max_icon_size
+
+
+def is_safe_path(name):
+    """Check that an archive member stays inside the extraction directory."""
+    if not name or '\x00' in name or '\\' in name:
+        return False
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        return False
+    return '..' not in posixpath.normpath(name).split('/')
+
+
+def check_central_directory(zip_ref, limits):
+    """Validate entry metadata without decompressing anything."""
+    infos = zip_ref.infolist()
+    if len(infos) > limits.max_entries:
+        raise ValueError(f"Archive has too many entries ({len(infos)} > {limits.max_entries})")
+
+    total_size = 0
+    for info in infos:
+        if not is_safe_path(info.filename):
+            raise ValueError(f"Unsafe path in archive: {info.filename}")
+        if stat.S_ISLNK(info.external_attr >> 16):
+            raise ValueError(f"Symbolic links are not allowed: {info.filename}")
+        if info.flag_bits & 0x1:
+            raise ValueError(f"Encrypted entries are not allowed: {info.filename}")
+        if info.file_size > limits.ratio_min_size and \
+                info.file_size > info.compress_size * limits.max_ratio:
+            raise ValueError(f"Suspicious compression ratio for {info.filename}")
+
+        total_size += info.file_size
+        if total_size > limits.max_total_size:
+            raise ValueError("Archive expands beyond the allowed size")
+    return infos
+
+
+def read_entry(zip_ref, info, max_size):
+    """Read one entry into memory, refusing to produce more than ``max_size`` bytes."""
+    if info.file_size > max_size:
+        raise ValueError(f"{info.filename} is too large")
+    chunks = []
+    size = 0
+    with zip_ref.open(info) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > max_size or size > info.file_size:
+                raise ValueError(f"{info.filename} expands beyond its declared size")
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def verify_entries(zip_ref, infos, limits):
+    """Decompress every entry as a stream, counting real output against the limits."""
+    total_size = 0
+    for info in infos:
+        if info.is_dir():
+            continue
+        entry_size = 0
+        with zip_ref.open(info) as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                entry_size += len(chunk)
+                total_size += len(chunk)
+                if entry_size > info.file_size:
+                    raise ValueError(f"{info.filename} expands beyond its declared size")
+                if total_size > limits.max_total_size:
+                    raise ValueError("Archive expands beyond the allowed size")
+
+
+def open_validated(path, limits):
+    """
+    Open and fully validate an uploaded archive.
+
+    Returns the open ZipFile and a map of member names to ZipInfo; raises
+    ValueError for anything malformed or over the limits.
+    """
+    if not zipfile.is_zipfile(path):
+        raise ValueError("File is not a valid zip archive")
+
+    zip_ref = zipfile.ZipFile(path, 'r')
+    try:
+        infos = check_central_directory(zip_ref, limits)
+        verify_entries(zip_ref, infos, limits)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, EOFError) as e:
+        zip_ref.close()
+        raise ValueError(f"Corrupt archive: {e}")
+    except Exception:
+        zip_ref.close()
+        raise
+    return zip_ref, {info.filename: info for info in infos}
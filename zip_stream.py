@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Streaming zip assembly for modpack builds.
+
+Archives are written in a single pass straight from their sources (bytes,
+files on disk, open streams or chunk iterators) into the destination, without
+staging anything in a temporary directory.
+
+When the destination cannot seek, ``zipfile`` has to follow every entry with
+a data descriptor. Java's ``ZipInputStream`` only accepts those after
+deflated entries, so on such sinks every entry is deflated; already
+compressed files are only stored when writing to a seekable file.
+"""
+
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+# Entries that are already compressed are stored as-is to save CPU, when the sink allows it
+STORED_EXTENSIONS = ('.jar', '.zip', '.png', '.jpg', '.jpeg', '.gif')
+
+
+class ZipEntry:
+    """A file to add to an archive."""
+
+    def __init__(self, arcname, source, size=None):
+        """
+        ``source`` may be bytes, a path, a readable file object or an
+        iterable of byte chunks. ``size`` is the uncompressed size if known.
+        """
+        self.arcname = arcname
+        self.source = source
+        self.size = len(source) if isinstance(source, bytes) else size
+
+    def iter_chunks(self):
+        """Yield the content of the entry in chunks."""
+        source = self.source
+        if isinstance(source, bytes):
+            yield source
+        elif isinstance(source, str):
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    yield chunk
+        elif hasattr(source, 'read'):
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                yield chunk
+        else:
+            for chunk in source:
+                if chunk:
+                    yield chunk
+
+
+class _ChunkBuffer:
+    """Non-seekable sink that collects written bytes until they are drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _compress_type(arcname, compression, seekable):
+    if not seekable:
+        # Stored entries followed by a data descriptor break Java's ZipInputStream
+        return zipfile.ZIP_DEFLATED
+    if arcname.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return compression
+
+
+def _write_entries(zipf, entries, compression, seekable, on_chunk=None):
+    """Write entries into an open archive, calling ``on_chunk`` after each chunk."""
+    for entry in entries:
+        info = zipfile.ZipInfo(entry.arcname, date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = _compress_type(entry.arcname, compression, seekable)
+        info.external_attr = 0o644 << 16
+        if entry.size is not None:
+            info.file_size = entry.size
+
+        with zipf.open(info, 'w', force_zip64=entry.size is None) as dest:
+            for chunk in entry.iter_chunks():
+                dest.write(chunk)
+                if on_chunk:
+                    yield on_chunk()
+        if on_chunk:
+            yield on_chunk()
+
+
+def write_zip(fileobj, entries, compression=zipfile.ZIP_DEFLATED):
+    """Write an archive to a file object in one pass. Returns the archive size."""
+    seekable = fileobj.seekable() if hasattr(fileobj, 'seekable') else False
+    start = fileobj.tell() if seekable else 0
+    with zipfile.ZipFile(fileobj, 'w', compression) as zipf:
+        for _ in _write_entries(zipf, entries, compression, seekable):
+            pass
+    fileobj.flush()
+    return fileobj.tell() - start if seekable else None
+
+
+def iter_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """Yield an archive as byte chunks, e.g. for a streamed HTTP response."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression) as zipf:
+        for data in _write_entries(zipf, entries, compression, False, on_chunk=buffer.drain):
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data